@@ -1,5 +1,5 @@
 import streamlit as st
-from modules import learning_mode, view_history, add_passage, grammar_practice, admin_standards
+from modules import learning_mode, view_history, add_passage, grammar_practice, admin_standards, reports
 st.set_option("client.showErrorDetails", True)
 # ---------- Streamlit Page Config ----------
 st.set_page_config(
@@ -13,7 +13,7 @@ st.set_page_config(
 st.sidebar.title("📚 Homework Helper")
 menu = st.sidebar.radio(
     "Navigation",
-    ["Learning Mode", "View History", "Add Passage", "Grammar Practice", "Admin"],
+    ["Learning Mode", "View History", "Add Passage", "Grammar Practice", "Reports", "Admin"],
     help="Choose what you'd like to do today!"
 )
 
@@ -26,6 +26,8 @@ elif menu == "Add Passage":
     add_passage.show()
 elif menu == "Grammar Practice":
     grammar_practice.show()
+elif menu == "Reports":
+    reports.show()
 elif menu == "Admin":
     admin_standards.show()
 
@@ -1,6 +1,7 @@
 import streamlit as st
-from utils.llm_helpers import generate_grammar_question, get_grammar_hint, generate_sentences_from_topics, get_available_categories
+from utils.llm_helpers import generate_grammar_questions, get_grammar_hint, generate_sentences_from_topics, get_available_categories
 from utils.db import log_attempt
+from utils.question_bank import take_questions, start_refill_worker, request_refill
 
 DEBUG = False  # Set to False to disable debug logs
 
@@ -28,13 +29,24 @@ def show():
     else:
         chosen_category = None
 
+    # Keep the pre-generated question pool topped up in the background
+    start_refill_worker()
+
     num_sentences = st.slider("How many sentences do you want to practice with?", 1, 10, 3)
     if st.button("🔄 Generate Sentences"):
         with st.spinner("Generating sentences..."):
-            if mode == "Generate at random":
-                sentences = generate_sentences_from_topics(n=num_sentences, category=chosen_category)
-            else:
-                sentences = generate_sentences_from_topics(n=num_sentences, category=chosen_category)
+            # Serve from the question bank first; only generate live for whatever it can't cover
+            try:
+                sentences = take_questions(num_sentences, category=chosen_category)
+                for s in sentences:
+                    s["from_bank"] = True  # already a validated question; no need to write another
+            except Exception as e:
+                if DEBUG:
+                    st.write(f"DEBUG: Question bank unavailable: {e}")
+                sentences = []
+            if len(sentences) < num_sentences:
+                sentences += generate_sentences_from_topics(n=num_sentences - len(sentences), category=chosen_category)
+            request_refill()
             if not sentences:
                 st.error("Failed to generate sentences. Please check your API or LLM settings.")
                 return
@@ -55,27 +67,33 @@ def show():
 
     # Generate questions once and store them in session_state to avoid regeneration on each rerun
     if "grammar_questions" not in st.session_state:
-        questions = []
-        for sentence in sentences:
-            # Pull the last used category or default to general
-            category = st.session_state.get("last_category", "general")
-            if DEBUG:
-                st.write(f"DEBUG: Using category '{category}' for question generation on sentence: {sentence}")
-
-            # Thread category into question generation
-
-            question = generate_grammar_question(
-                sentence,
-                include_answer=True,
-                category=category,
-            )
-
-            # Store category for continuity
-            st.session_state["last_category"] = category
-
-            if not question:
-                question = {"prompt": "Could not generate question.", "options": [], "answer": ""}
-            questions.append(question)
+        # Pull each sentence's own category, or the last used category, or default to general
+        fallback_category = st.session_state.get("last_category", "general")
+        categories = [
+            (s.get("category") if isinstance(s, dict) else None) or fallback_category
+            for s in sentences
+        ]
+        if DEBUG:
+            st.write(f"DEBUG: Using categories {categories} for batched question generation")
+
+        # Bank questions are used as stored; the rest go out in one request instead of one per sentence
+        questions = [
+            {"prompt": s["question"], "options": s["options"], "answer": s["answer"]}
+            if isinstance(s, dict) and s.get("from_bank") else None
+            for s in sentences
+        ]
+        live = [i for i, q in enumerate(questions) if q is None]
+        if live:
+            with st.spinner("Writing questions..."):
+                generated = generate_grammar_questions(
+                    [sentences[i] for i in live], categories=[categories[i] for i in live], include_answer=True
+                )
+            for i, q in zip(live, generated):
+                questions[i] = q
+        questions = [
+            q or {"prompt": "Could not generate question.", "options": [], "answer": ""}
+            for q in questions
+        ]
         st.session_state["grammar_questions"] = questions
 
     st.subheader("🧠 Identify Grammar Elements")
@@ -1,8 +1,59 @@
 import streamlit as st
 import os
-from utils.db import SessionLocal, Session, Passage, Question, Word
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.db import SessionLocal, Passage, Word, save_passage_analysis
 from utils.passage_loader import load_random_passage
-from utils.llm_helpers import simplify_text, generate_questions, explain_word
+from utils.llm_helpers import analyze_passage, explain_word_stream, explain_words, PassageAnalysisStream
+from utils.llm_scheduler import llm_priority
+
+# ---------- Speculative Prefetch ----------
+# A loaded passage is almost always simplified next, so start the analysis right away
+PREFETCH_WORKERS = int(os.getenv("PASSAGE_PREFETCH_WORKERS", "2"))
+PREFETCH_QUEUE = int(os.getenv("PASSAGE_PREFETCH_QUEUE", "4"))  # prefetches queued or running, all sessions
+_prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="passage-prefetch")
+_prefetch_slots = threading.BoundedSemaphore(PREFETCH_QUEUE)
+
+def _passage_key(text):
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+
+def _analyze_in_background(text):
+    # Prefetch class: yields to anything a child is actively waiting on
+    with llm_priority("prefetch"):
+        return analyze_passage(text)
+
+def _start_prefetch(text):
+    """Analyze a newly loaded passage in the background; abandons work for the previous passage."""
+    key = _passage_key(text)
+    current = st.session_state.get("passage_prefetch")
+    if current and current[0] == key:
+        return
+    if current:
+        # Only queued work can be cancelled; a call already in flight finishes and is ignored
+        current[1].cancel()
+    st.session_state.pop("passage_prefetch", None)
+    # Speculation is optional: with the queue full, Simplify just analyzes the passage itself
+    if not _prefetch_slots.acquire(blocking=False):
+        return
+    future = _prefetch_pool.submit(_analyze_in_background, text)
+    future.add_done_callback(lambda _: _prefetch_slots.release())
+    st.session_state["passage_prefetch"] = (key, future)
+
+def _prefetched_analysis(text):
+    """The prefetched analysis for `text` (waiting for it if already running), or None."""
+    current = st.session_state.get("passage_prefetch")
+    if not current or current[0] != _passage_key(text):
+        return None
+    future = current[1]
+    if future.cancel():
+        # Still queued behind other sessions' prefetches: the caller runs it now at interactive priority
+        return None
+    try:
+        return future.result()
+    except Exception:
+        # Cancelled or failed: the caller analyzes the passage itself
+        return None
 
 def show():
     st.title("📖 Homework Helper - Learning Mode")
@@ -30,6 +81,9 @@ def show():
         else:
             st.warning("No passages found locally or online.")
 
+    if st.session_state.get("loaded_passage"):
+        _start_prefetch(st.session_state["loaded_passage"])
+
     topic = st.text_input("Enter a topic or short title for this passage:")
     text = st.text_area(
         "Paste the passage here or load one using the button above:",
@@ -39,30 +93,45 @@ def show():
 
     if st.button("Simplify Passage"):
         if text.strip():
-            simplified = simplify_text(text)
+            # A prefetch already running for this passage is cheaper to wait for than a second call
+            with st.spinner("Simplifying the passage and preparing questions..."):
+                analysis = _prefetched_analysis(text)
+
             st.subheader("Simplified Version")
-            st.write(simplified)
+            if analysis:
+                st.write(analysis.simplified_text)
+            else:
+                # One call returns the simplified text, questions and tricky words together;
+                # paragraphs appear as the model writes them (long passages: as each part finishes).
+                # After an edit, hand over the last analysis so only changed paragraphs are re-sent.
+                # Long passages are simplified in parts; show how many are done
+                last_text, last_analysis = st.session_state.get("passage_analysis", (None, None))
+                progress = st.empty()
+                stream = PassageAnalysisStream(
+                    text,
+                    previous=last_analysis if last_text != text else None,
+                    on_progress=lambda done, total: progress.progress(done / total, text=f"Simplified part {done} of {total}"),
+                )
+                st.write_stream(stream)
+                progress.empty()
+                analysis = stream.analysis
+            st.session_state["passage_analysis"] = (text, analysis)
+            if analysis.reused_parts:
+                st.caption(f"Reused {analysis.reused_parts} unchanged paragraph(s) from the last run.")
 
-            # Save to DB
-            try:
-                session_obj = Session(topic=topic or "Untitled")
-                db.add(session_obj)
-                db.commit()
+            st.subheader("Comprehension Questions")
+            for i, q in enumerate(analysis.questions, start=1):
+                st.write(f"{i}. {q}")
 
-                passage = Passage(session_id=session_obj.id, original_text=text, simplified_text=simplified)
-                db.add(passage)
-                db.commit()
-                st.success("Saved simplified passage!")
+            if analysis.vocabulary:
+                st.subheader("Tricky Words")
+                for w, explanation in analysis.vocabulary.items():
+                    st.write(f"**{w}** — {explanation}")
 
-                # Generate comprehension questions
-                st.subheader("Comprehension Questions")
-                questions = generate_questions(text)
-                st.write(questions)
-                for q in questions.split("\n"):
-                    if q.strip():
-                        q_obj = Question(passage_id=passage.id, question_text=q.strip())
-                        db.add(q_obj)
-                db.commit()
+            # Save session, passage, questions and words together
+            try:
+                save_passage_analysis(db, topic, text, analysis)
+                st.success("Saved simplified passage!")
             except Exception as e:
                 st.error(f"Error saving passage: {e}")
         else:
@@ -70,20 +139,40 @@ def show():
 
     st.divider()
     st.subheader("Word Helper")
-    word = st.text_input("Enter a tricky word:")
+    word = st.text_input("Enter a tricky word (or several, separated by commas):")
     if st.button("Explain Word"):
-        if word.strip() and text.strip():
-            meaning = explain_word(word, text)
-            st.write(meaning)
+        words = [w.strip() for w in word.split(",") if w.strip()]
+        if len(words) > 1 and text.strip():
+            # Several words: one batched request for the ones the glossary doesn't know yet
+            with st.spinner("Explaining words..."):
+                meanings = explain_words(words, text)
+            for w, meaning in meanings.items():
+                st.write(f"**{w}** — {meaning}")
             try:
                 last_passage = db.query(Passage).order_by(Passage.id.desc()).first()
                 if last_passage:
-                    w = Word(passage_id=last_passage.id, word=word.strip(), explanation=meaning)
-                    db.add(w)
+                    db.add_all([Word(passage_id=last_passage.id, word=w, explanation=m) for w, m in meanings.items()])
                     db.commit()
-                    st.success("Word explanation saved!")
+                    st.success("Word explanations saved!")
             except Exception as e:
-                st.error(f"Error saving word: {e}")
+                st.error(f"Error saving words: {e}")
+        elif word.strip() and text.strip():
+            # Words the passage analysis already explained are answered (and were saved) without a call
+            analyzed_text, analysis = st.session_state.get("passage_analysis", (None, None))
+            known = analysis.explanation_for(word) if analysis and analyzed_text == text else None
+            if known:
+                st.write(known)
+            else:
+                meaning = st.write_stream(explain_word_stream(word, text))
+                try:
+                    last_passage = db.query(Passage).order_by(Passage.id.desc()).first()
+                    if last_passage:
+                        w = Word(passage_id=last_passage.id, word=word.strip(), explanation=meaning)
+                        db.add(w)
+                        db.commit()
+                        st.success("Word explanation saved!")
+                except Exception as e:
+                    st.error(f"Error saving word: {e}")
         else:
             st.warning("Add both the passage and the word.")
 
@@ -0,0 +1,98 @@
+import streamlit as st
+import pandas as pd
+from utils.llm_telemetry import fetch_calls, latency_summary, daily_breakdown
+from utils.llm_cache import cache_stats
+from utils.llm_coalesce import coalesce_stats
+from utils.llm_hedging import hedge_stats
+from utils.llm_router import get_router
+from utils.llm_scheduler import scheduler_stats
+from utils.llm_budget import ALL_FEATURES, budget_report, set_quota
+
+DEBUG = False
+
+def show():
+    st.title("📈 LLM Usage Reports")
+    st.write("Latency, token usage and output quality of every model call, by feature.")
+
+    days = st.selectbox("Time range", [1, 7, 30, 90], index=1, format_func=lambda d: f"Last {d} day(s)")
+    rows = fetch_calls(days)
+    if DEBUG: st.write(f"DEBUG: {len(rows)} telemetry rows loaded")
+
+    if not rows:
+        st.info("No LLM calls recorded yet. Use Learning Mode or Grammar Practice and come back.")
+        return
+
+    summary = latency_summary(rows)
+
+    # ---------- Headline Metrics ----------
+    total_tokens = sum(s["total_tokens"] for s in summary)
+    cache_hits = sum(1 for r in rows if r["cache_hit"])
+    errors = sum(1 for r in rows if r["error"])
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("LLM calls", len(rows))
+    col2.metric("Cache hit rate", f"{cache_hits / len(rows):.0%}")
+    col3.metric("Tokens", f"{total_tokens:,}")
+    col4.metric("Errors", errors)
+
+    stats = cache_stats()
+    flights = coalesce_stats()
+    hedges = hedge_stats()
+    st.caption(
+        f"Response cache: {stats['entries']} entries · "
+        f"{stats['hits']} hits / {stats['misses']} misses since the app started · "
+        f"{flights['coalesced']} duplicate in-flight requests coalesced · "
+        f"{hedges['hedged']} hedged requests ({hedges['hedge_wins']} won)"
+    )
+
+    # ---------- Token Budget ----------
+    st.subheader("💰 Token budget (today)")
+    st.caption("Near a quota, calls serve stored answers or shorter passages; past it they fall back.")
+    st.dataframe(pd.DataFrame(budget_report()).set_index("feature"), use_container_width=True)
+    with st.expander("Set a daily quota"):
+        features = [ALL_FEATURES] + sorted({s["feature"] for s in summary if s["feature"]})
+        feature = st.selectbox("Feature", features, format_func=lambda f: "All features" if f == ALL_FEATURES else f)
+        quota = st.number_input("Tokens per day (0 = no cap)", min_value=0, value=0, step=10000)
+        if st.button("Save quota"):
+            set_quota(feature, quota)
+            st.success("Quota saved.")
+
+    # ---------- Per-Feature Breakdown ----------
+    st.subheader("⏱️ Latency by feature")
+    st.caption("Percentiles cover live model calls only; cache hits and errors are excluded.")
+    st.dataframe(pd.DataFrame(summary).set_index("feature"), use_container_width=True)
+
+    st.subheader("🔢 Tokens by feature")
+    tokens = pd.DataFrame(summary).set_index("feature")[["prompt_tokens", "completion_tokens"]]
+    st.bar_chart(tokens)
+
+    st.subheader("🚦 Scheduler queues")
+    st.caption("Queue depth right now and recent queue waits per priority class (since the app started). "
+               "Interactive waits should stay near zero even while prefetch and batch work is queued.")
+    st.dataframe(pd.DataFrame(scheduler_stats()).set_index("priority"), use_container_width=True)
+
+    routes = get_router().report()
+    if routes:
+        st.subheader("🧭 Model routing")
+        st.caption("Rolling stats the router uses to pick a model per task (since the app started).")
+        st.dataframe(pd.DataFrame(routes).set_index(["task", "model"]), use_container_width=True)
+
+    # ---------- Trends ----------
+    daily = pd.DataFrame(daily_breakdown(rows)).set_index("day")
+    st.subheader("📅 Daily latency (ms)")
+    st.line_chart(daily[["p50_ms", "p95_ms"]])
+
+    st.subheader("🧩 JSON parse-failure rate")
+    parse = daily[["parse_failure_rate"]].dropna()
+    if parse.empty:
+        st.info("No structured-output calls in this range.")
+    else:
+        st.line_chart(parse)
+
+    # ---------- Recent Errors ----------
+    failed = [r for r in rows if r["error"]]
+    if failed:
+        with st.expander(f"⚠️ Recent errors ({len(failed)})"):
+            st.dataframe(
+                pd.DataFrame(failed[-50:])[["created_at", "feature", "model", "error"]],
+                use_container_width=True,
+            )
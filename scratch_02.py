@@ -1,7 +1,8 @@
 import yaml
-import sqlite3
 import os
 
+from utils.db_connection import get_connection
+
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 yaml_path = os.path.join(DATA_DIR, "grammar_concept_map.yaml")
 print(yaml_path)
@@ -15,25 +16,10 @@ DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 yaml_path = os.path.join(DATA_DIR, "grammar_concept_map.yaml")
 # print(yaml_path)
 
-# Connect to SQLite database (creates if it doesn't exist)
-conn = sqlite3.connect('data/homework_helper.db')
+# Connect to the app database; the concept_map table is created by utils/migrations.py
+conn = get_connection()
 cursor = conn.cursor()
 
-# print
-# Drop the table if it exists to start fresh
-# cursor.execute('DROP TABLE IF EXISTS main.concept_map')
-
-# Create the table
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS main.concept_map (
-       id INTEGER PRIMARY KEY AUTOINCREMENT,
-        subject TEXT,
-        category TEXT,
-        topic TEXT,
-        question_focus TEXT
-    )
-''')
-
 # Parse the data and insert rows
 grammar_data = data.get('grammar', {})
 # print(grammar_data)?
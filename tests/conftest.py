@@ -0,0 +1,27 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Point the app at a throwaway database and the in-process fake model before any utils module
+# is imported (utils/db_connection.py reads HOMEWORK_DB_PATH at import time).
+_DB_DIR = tempfile.mkdtemp(prefix="homework-helper-tests-")
+os.environ["HOMEWORK_DB_PATH"] = os.path.join(_DB_DIR, "homework_helper.db")
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["ATTEMPT_LOG_SYNC"] = "1"
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+@pytest.fixture
+def fake_backend():
+    """Install a fresh FakeBackend (canned replies, call counter) and reset the per-feature counts."""
+    from utils import llm_backends, llm_helpers
+    from utils.llm_cache import clear_cache
+
+    clear_cache()
+    backend = llm_backends.FakeBackend()
+    llm_backends.set_backend(backend)
+    llm_helpers.reset_llm_call_counts()
+    return backend
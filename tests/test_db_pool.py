@@ -0,0 +1,39 @@
+import threading
+
+from utils.db import SQLITE_ORM_MAX_OVERFLOW, SQLITE_ORM_POOL_SIZE, SessionLocal, Topic, engine
+
+
+def _run_sessions(names, errors):
+    def work(name):
+        db = SessionLocal()
+        try:
+            db.add(Topic(name=name, subject="pool-test"))
+            db.commit()
+            db.query(Topic).filter(Topic.subject == "pool-test").count()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=work, args=(name,)) for name in names]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def test_orm_sessions_on_more_threads_than_the_pool_holds(caplog):
+    n = SQLITE_ORM_POOL_SIZE + SQLITE_ORM_MAX_OVERFLOW + 10
+    errors = []
+    # Two waves of fresh threads, like Streamlit reruns: pooled connections move between threads
+    _run_sessions([f"pool-a-{i}" for i in range(n)], errors)
+    _run_sessions([f"pool-b-{i}" for i in range(n)], errors)
+
+    assert errors == []
+    assert "ProgrammingError" not in caplog.text
+    assert engine.pool.checkedout() == 0
+    db = SessionLocal()
+    try:
+        assert db.query(Topic).filter(Topic.subject == "pool-test").count() == 2 * n
+    finally:
+        db.close()
@@ -0,0 +1,42 @@
+import json
+
+from utils import llm_helpers
+
+SENTENCE = "The dog ran to the park."
+
+
+def _question_batch(answer):
+    return json.dumps({"questions": [
+        {"id": 1, "prompt": "Which word is a noun?", "options": ["dog", "ran", "to", "the"], "answer": answer},
+    ]})
+
+
+def _replies(*replies):
+    remaining = iter(replies)
+    return lambda messages: next(remaining)
+
+
+def test_valid_reply_is_served_from_the_cache(fake_backend):
+    for _ in range(2):
+        llm_helpers.generate_grammar_questions([SENTENCE], max_retries=0)
+
+    assert fake_backend.calls == 1
+
+
+def test_retry_after_failed_validation_reaches_the_model(fake_backend):
+    # "park" is not one of the options, so the first reply fails validation
+    fake_backend.responses = _replies(_question_batch("park"), _question_batch("dog"))
+
+    [question] = llm_helpers.generate_grammar_questions([SENTENCE], include_answer=True, max_retries=1)
+
+    assert fake_backend.calls == 2
+    assert question["answer"] == "dog"
+
+
+def test_unparseable_reply_is_not_cached(fake_backend):
+    fake_backend.responses = lambda messages: "Sorry, I can't write that question."
+
+    for _ in range(2):
+        llm_helpers.generate_grammar_questions([SENTENCE], max_retries=0)
+
+    assert fake_backend.calls == 2
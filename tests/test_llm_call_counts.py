@@ -0,0 +1,44 @@
+import pytest
+
+from utils import llm_helpers
+from utils.concept_map_db import invalidate_concepts
+from utils.db_connection import get_connection
+
+TOPICS = [
+    ("punctuation", "commas", "Where does the comma go?"),
+    ("vocabulary", "prefixes", "What does the prefix mean?"),
+    ("parts_of_speech", "adverbs", "Which word describes the verb?"),
+]
+
+
+@pytest.fixture(autouse=True)
+def grammar_topics():
+    conn = get_connection()
+    try:
+        conn.execute("DELETE FROM concept_map")
+        conn.execute("DELETE FROM topics")
+        for category, topic, focus in TOPICS:
+            conn.execute(
+                "INSERT INTO concept_map (subject, category, topic, question_focus) VALUES ('grammar', ?, ?, ?)",
+                (category, topic, focus),
+            )
+            conn.execute("INSERT INTO topics (name, subject, active) VALUES (?, 'grammar', 1)", (topic,))
+        conn.commit()
+    finally:
+        conn.close()
+    invalidate_concepts()
+
+
+def test_one_model_call_per_topic(fake_backend):
+    questions = llm_helpers.generate_sentences_from_topics(topics=[t for _, t, _ in TOPICS])
+
+    assert questions
+    assert fake_backend.calls == len(TOPICS)
+    assert llm_helpers.get_llm_call_counts() == {"generate_sentences_from_topics": len(TOPICS)}
+
+
+def test_random_sample_makes_one_call_per_selected_topic(fake_backend):
+    llm_helpers.generate_sentences_from_topics(n=2)
+
+    assert fake_backend.calls == 2
+    assert llm_helpers.get_llm_call_counts() == {"generate_sentences_from_topics": 2}
@@ -0,0 +1,33 @@
+from utils import llm_helpers
+
+FOXES = (
+    "Red foxes live in forests, fields and even big cities.\n\n"
+    "They hunt mice and rabbits at night and rest during the day.\n\n"
+    "A young fox stays with its family until the autumn."
+)
+VOLCANOES = (
+    "A volcano is an opening in the ground where melted rock comes out.\n\n"
+    "When it erupts, ash and lava can travel a long way.\n\n"
+    "Scientists watch volcanoes closely to warn people in time."
+)
+
+
+def test_edit_reuses_unchanged_paragraphs(fake_backend):
+    previous = llm_helpers.analyze_passage(FOXES)
+    edited = FOXES.replace("until the autumn", "until the next spring")
+
+    result = llm_helpers.analyze_passage(edited, previous=previous)
+
+    assert result.reused_parts == 2
+    assert result.questions == previous.questions
+
+
+def test_edit_mode_ignores_unrelated_previous(fake_backend):
+    llm_helpers.analyze_passage(VOLCANOES)  # its paragraphs are now in the paragraph cache
+    previous = llm_helpers.analyze_passage(FOXES)
+    previous.questions = ["Where do red foxes live?"]
+
+    result = llm_helpers.analyze_passage(VOLCANOES, previous=previous)
+
+    assert result.reused_parts == 0
+    assert "Where do red foxes live?" not in result.questions
@@ -0,0 +1,132 @@
+# ==============================
+# 📝 Homework Helper - Buffered Attempt Logger
+# ==============================
+# utils/db.log_attempt puts each answer on an in-process queue. One writer thread inserts
+# the queued rows with a single executemany + commit, when ATTEMPT_LOG_BATCH_SIZE rows
+# are waiting or ATTEMPT_LOG_FLUSH_SECONDS after the first one, whichever comes first.
+# A classroom of "Check Answer" clicks then costs one write transaction, not one each.
+#
+# flush() writes everything queued so far; it runs at interpreter exit and before the
+# attempts are read back. ATTEMPT_LOG_SYNC=1 writes every attempt immediately (tests, scripts).
+import atexit
+import os
+import queue
+import threading
+import time
+
+from utils.db_connection import get_connection
+
+ATTEMPT_LOG_BATCH_SIZE = int(os.getenv("ATTEMPT_LOG_BATCH_SIZE", "50"))
+ATTEMPT_LOG_FLUSH_SECONDS = float(os.getenv("ATTEMPT_LOG_FLUSH_SECONDS", "1.0"))
+ATTEMPT_LOG_SYNC = os.getenv("ATTEMPT_LOG_SYNC", "0") == "1"
+
+INSERT_ATTEMPT = """
+    INSERT INTO attempts
+    (subject, topic, question_type, question_text, user_answer, correct_answer, is_correct, hint_used, attempt_date)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def write_attempts(rows):
+    """Insert attempt rows in one transaction."""
+    conn = get_connection()
+    try:
+        conn.executemany(INSERT_ATTEMPT, rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class _Flush:
+    """Queue marker: set once every row queued before it has been written."""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class AttemptLogger:
+    def __init__(self, batch_size=ATTEMPT_LOG_BATCH_SIZE, flush_seconds=ATTEMPT_LOG_FLUSH_SECONDS):
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self._queue = queue.Queue()
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def log(self, row):
+        if ATTEMPT_LOG_SYNC:
+            write_attempts([row])
+            return
+        self._ensure_writer()
+        self._queue.put(row)
+
+    def flush(self, timeout=10.0):
+        """Block until everything logged so far is in the database."""
+        if self._writer is not None and self._writer.is_alive():
+            marker = _Flush()
+            self._queue.put(marker)
+            if marker.done.wait(timeout):
+                return
+        # No writer (or it is stuck): write what is left from this thread
+        self._write(self._drain())
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run, name="attempt-logger", daemon=True)
+                self._writer.start()
+
+    def _drain(self):
+        rows = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return rows
+            if isinstance(item, _Flush):
+                item.done.set()
+            else:
+                rows.append(item)
+
+    def _next_batch(self):
+        """Rows up to the batch size or time limit, plus any flush markers met on the way."""
+        first = self._queue.get()
+        items = [first]
+        deadline = time.monotonic() + self.flush_seconds
+        while not isinstance(items[-1], _Flush) and sum(not isinstance(i, _Flush) for i in items) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._next_batch()
+            self._write([i for i in items if not isinstance(i, _Flush)])
+            for item in items:
+                if isinstance(item, _Flush):
+                    item.done.set()
+
+    def _write(self, rows):
+        if not rows:
+            return
+        try:
+            write_attempts(rows)
+        except Exception as e:
+            # Losing a batch of history must never break a practice session
+            print(f"Attempt log write failed ({len(rows)} rows): {e}")
+
+
+_logger = AttemptLogger()
+atexit.register(_logger.flush)
+
+
+def log_attempt_row(row):
+    _logger.log(row)
+
+
+def flush_attempts(timeout=10.0):
+    _logger.flush(timeout)
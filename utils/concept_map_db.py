@@ -1,157 +1,178 @@
+# ==============================
+# 🧭 Homework Helper - Concept Resolver
+# ==============================
+# get_concept() used to run up to three SQL queries per lookup (exact IN, then OR'ed
+# LIKE '%...%' predicates, then the same LIKEs joined across topics/concepts).
+# The concept map is small and rarely written, so it is now read once into an index
+# (normalized names, aliases, trigrams) and every lookup is a few dict/set operations.
+#
+# Code that writes concept_map (topic_manager's syncs) calls invalidate_concepts()
+# afterwards; that bumps a generation counter and the next lookup rebuilds the index.
 import os
-import sqlite3
+import threading
+
+from utils.db_connection import DB_PATH, get_connection
+
+# Common aliases: normalized topic a teacher might type -> topic stored in concept_map
+TOPIC_ALIASES = {
+    "adverb": "adjectives_and_adverbs",
+    "adverbs": "adjectives_and_adverbs",
+    "run_on_sentence": "run_on_sentences",
+    "quotation_mark": "quotation_marks",
+    "semicolon": "semicolons",   # in case you ever store plural
+    "colon": "colons",
+}
+
+_generation = 0
+_index = None
+_index_lock = threading.Lock()
+
+
+# --- helpers -----------------------------------------------------------
+def _normalize(s: str) -> str:
+    # Topics are stored snake_case; fold spaces and hyphens the same way on both sides
+    return (s or "").strip().lower().replace("-", "_").replace(" ", "_")
+
+
+def _variants(s: str):
+    s = _normalize(s)
+    cand = {s}
+
+    # singular/plural toggles
+    if s.endswith("s"):
+        cand.add(s[:-1])               # antonyms -> antonym, pronouns -> pronoun
+    else:
+        cand.add(s + "s")              # antonym -> antonyms
+
+    # sentence / sentences toggles
+    cand.add(s.replace("_sentence", "_sentences"))
+    cand.add(s.replace("_sentences", "_sentence"))
+
+    if s in TOPIC_ALIASES:
+        cand.add(_normalize(TOPIC_ALIASES[s]))
+
+    # drop empties and dedupe
+    return [c for c in sorted(cand) if c]
+
+
+def _trigrams(s: str):
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class ConceptIndex:
+    """Every concept_map row for one build, indexed per subject by normalized topic and by trigram."""
+
+    def __init__(self, rows, generation):
+        self.generation = generation
+        self.rows = {}        # subject -> [row dict, ...] in load order
+        self.by_name = {}     # subject -> {normalized topic: first position}
+        self.by_trigram = {}  # subject -> {trigram: {positions}}
+        for subject, category, topic, question_focus in rows:
+            concepts = self.rows.setdefault(subject, [])
+            position = len(concepts)
+            concepts.append({
+                "subject": subject,
+                "category": category,
+                "topic": topic,
+                "question_focus": question_focus,
+            })
+            name = _normalize(topic)
+            self.by_name.setdefault(subject, {}).setdefault(name, position)
+            trigrams = self.by_trigram.setdefault(subject, {})
+            for gram in _trigrams(name):
+                trigrams.setdefault(gram, set()).add(position)
+
+    def _contains(self, subject, variant):
+        """Positions of topics containing `variant` (the old LIKE '%variant%')."""
+        concepts = self.rows.get(subject, [])
+        grams = _trigrams(variant)
+        if grams:
+            postings = self.by_trigram.get(subject, {})
+            candidates = None
+            for gram in grams:
+                found = postings.get(gram)
+                if not found:
+                    return []
+                candidates = found if candidates is None else candidates & found
+            positions = candidates
+        else:
+            positions = range(len(concepts))  # one or two letters: too short for trigrams
+        return [p for p in positions if variant in _normalize(concepts[p]["topic"])]
+
+    def resolve(self, topic, subject="grammar"):
+        """Exact (with plural/alias variants) then substring match; None if nothing fits."""
+        concepts = self.rows.get(subject)
+        if not concepts:
+            return None
+        variants = _variants(topic)
+
+        # 1) Exact match on a normalized variant; the first row in load order wins
+        names = self.by_name[subject]
+        exact = [names[v] for v in variants if v in names]
+        if exact:
+            return dict(concepts[min(exact)])
+
+        # 2) Fuzzy: the stored topic contains one of the variants
+        fuzzy = [p for v in variants for p in self._contains(subject, v)]
+        if fuzzy:
+            return dict(concepts[min(fuzzy)])
+        return None
+
+
+def _load_index(generation):
+    if not os.path.exists(DB_PATH):
+        raise FileNotFoundError(f"Database not found at {DB_PATH}")
+    conn = get_connection()
+    try:
+        rows = conn.execute(
+            # Same tie-break as the old indexed LIMIT 1 queries: alphabetical by topic
+            "SELECT subject, category, topic, question_focus FROM concept_map ORDER BY LOWER(topic), id"
+        ).fetchall()
+    finally:
+        conn.close()
+    return ConceptIndex(rows, generation)
+
+
+def get_concept_index():
+    """The current ConceptIndex, rebuilt from the DB if concept_map changed since it was built."""
+    global _index
+    index = _index
+    if index is not None and index.generation == _generation:
+        return index
+    with _index_lock:
+        if _index is None or _index.generation != _generation:
+            _index = _load_index(_generation)
+        return _index
+
+
+def invalidate_concepts():
+    """Call after writing concept_map; the next lookup reloads the index."""
+    global _generation
+    with _index_lock:
+        _generation += 1
 
-# Path to your SQLite database
-DB_PATH = os.path.join(os.path.dirname(__file__), "../data/homework_helper.db")
 
 def get_concept(topic: str, subject: str = "grammar"):
     """
-    Retrieve a concept by exact or fuzzy topic match from the DB.
+    Retrieve a concept by exact or fuzzy topic match from the concept map.
 
     Strategy:
     1) Try exact matches against `concept_map.topic` using a set of
        normalized variants (handles singular/plural & common aliases).
-    2) If not found, try wildcard LIKE matches.
-    3) If still not found, try a join against `topics.name` and
-       `concepts.topic` to recover a matching concept and its metadata.
+    2) If not found, return the first concept whose topic contains one
+       of those variants (found through the trigram index).
 
     Returns a dict like:
-      {"category": ..., "question_focus": ...}
-    or a richer dict:
-      {"subject": ..., "category": ..., "topic": ..., "question_focus": ..., "grade_level": ..., "notes": ...}
+      {"subject": ..., "category": ..., "topic": ..., "question_focus": ...}
     or None if nothing is found.
     """
-    if not os.path.exists(DB_PATH):
-        raise FileNotFoundError(f"Database not found at {DB_PATH}")
-
-    # --- helpers -----------------------------------------------------------
-    def _normalize(s: str) -> str:
-        return (s or "").strip().lower().replace("-", "_")
+    return get_concept_index().resolve(topic, subject)
 
-    def _variants(s: str):
-        s = _normalize(s)
-        cand = {s}
 
-        # singular/plural toggles
-        if s.endswith("s"):
-            cand.add(s[:-1])               # antonyms -> antonym, pronouns -> pronoun
-        else:
-            cand.add(s + "s")              # antonym -> antonyms
-
-        # sentence / sentences toggles
-        cand.add(s.replace("_sentence", "_sentences"))
-        cand.add(s.replace("_sentences", "_sentence"))
-
-        # common aliases map
-        alias = {
-            "adverb": "adjectives_and_adverbs",
-            "adverbs": "adjectives_and_adverbs",
-            "run_on_sentence": "run_on_sentences",
-            "quotation_mark": "quotation_marks",
-            "semicolon": "semicolons",   # in case you ever store plural
-            "colon": "colons",
-        }
-        if s in alias:
-            cand.add(_normalize(alias[s]))
-
-        # drop empties and dedupe
-        return [c for c in sorted(cand) if c]
-
-    # ----------------------------------------------------------------------
-    topic_variants = _variants(topic)
-
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # 1) Exact match against concept_map.topic
-    try:
-        placeholders = ",".join(["?"] * len(topic_variants))
-        sql_exact = f"""
-            SELECT cm.subject, cm.category, cm.topic, cm.question_focus
-            FROM concept_map cm
-            WHERE cm.subject = ?
-              AND LOWER(cm.topic) IN ({placeholders})
-            LIMIT 1
-        """
-        cursor.execute(sql_exact, [subject] + [v for v in topic_variants])
-        row = cursor.fetchone()
-        if row:
-            conn.close()
-            return {
-                "subject": row[0],
-                "category": row[1],
-                "topic": row[2],
-                "question_focus": row[3],
-            }
-    except Exception:
-        pass  # fall through to fuzzy/join attempts
-
-    # 2) LIKE (fuzzy) match against concept_map.topic
-    try:
-        like_variants = [f"%{v}%" for v in topic_variants]
-        placeholders = " OR ".join([f"LOWER(cm.topic) LIKE ?" for _ in like_variants])
-        sql_like = f"""
-            SELECT cm.subject, cm.category, cm.topic, cm.question_focus
-            FROM concept_map cm
-            WHERE cm.subject = ?
-              AND ({placeholders})
-            LIMIT 1
-        """
-        cursor.execute(sql_like, [subject] + like_variants)
-        row = cursor.fetchone()
-        if row:
-            conn.close()
-            return {
-                "subject": row[0],
-                "category": row[1],
-                "topic": row[2],
-                "question_focus": row[3],
-            }
-    except Exception:
-        pass  # fall through to join attempt
-
-    # 3) Join with topics (t.name) and concepts (c.topic)
-    try:
-        # Note: topics has column `name` (not `topic`); concepts has `topic`.
-        # topics contains `grade_level`; concepts may contain `notes`.
-        like_variants = [f"%{v}%" for v in topic_variants]
-        placeholders_cm = " OR ".join([f"LOWER(cm.topic) LIKE ?" for _ in like_variants])
-        placeholders_t = " OR ".join([f"LOWER(t.name) LIKE ?" for _ in like_variants])
-        placeholders_c = " OR ".join([f"LOWER(c.topic) LIKE ?" for _ in like_variants])
-
-        sql_join = f"""
-            SELECT cm.subject, cm.category, cm.topic, cm.question_focus,
-                   t.grade_level, c.notes
-            FROM concept_map cm
-            LEFT JOIN topics   t ON t.subject = cm.subject
-                                AND (LOWER(t.name) = LOWER(cm.topic) OR {placeholders_t})
-            LEFT JOIN concepts c ON c.subject = cm.subject
-                                AND (LOWER(c.topic) = LOWER(cm.topic) OR {placeholders_c})
-            WHERE cm.subject = ?
-              AND ({placeholders_cm})
-            LIMIT 1
-        """
-        # Build the parameters in the same order as placeholders appear:
-        params = (
-            like_variants +  # for t.name LIKE
-            like_variants +  # for c.topic LIKE
-            [subject] +
-            like_variants    # for cm.topic LIKE
-        )
-        cursor.execute(sql_join, params)
-        row = cursor.fetchone()
-        if row:
-            conn.close()
-            return {
-                "subject": row[0],
-                "category": row[1],
-                "topic": row[2],
-                "question_focus": row[3],
-                "grade_level": row[4],
-                "notes": row[5],
-            }
-    except Exception:
-        pass
-
-    conn.close()
-    return None
\ No newline at end of file
+def get_concepts(topics, subject: str = "grammar"):
+    """
+    Resolve many topics at once: {original topic string: concept dict or None}.
+    The index is loaded (one query) at most once for the whole list, not per topic.
+    """
+    index = get_concept_index()
+    return {topic: index.resolve(topic, subject) for topic in dict.fromkeys(topics)}
@@ -1,14 +1,12 @@
-import os, yaml, sqlite3
+import os, yaml
 from functools import lru_cache
-
-DB_PATH = "data/homework_helper.db"  # adjust if different
+from utils.db_connection import DB_PATH, get_connection
 
 # Add this import to ensure DB mode works
 try:
-    from utils.concept_map_db import get_concept, DB_PATH
+    from utils.concept_map_db import get_concept
 except ImportError:
     get_concept = None
-    DB_PATH = None
 
 DATA_DIR = os.path.join(os.path.dirname(__file__),"../" "data")
 
@@ -20,7 +18,6 @@ def _load_concept_map_uncached(subject: str = "grammar"):
     Loads the concept map from DB if available; falls back to YAML.
     """
     import streamlit as st
-    from utils.concept_map_db import DB_PATH
 
     # Prefer DB if present
     if DB_PATH and os.path.exists(DB_PATH):
@@ -39,7 +36,7 @@ def load_concept_map(subject: str = "grammar"):
     return _load_concept_map_uncached(subject)
 
 def diagnostic_concept_map():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     cursor = conn.cursor()
 
     # Get all grammar topics
@@ -1,47 +1,56 @@
-import os, sqlite3
 from datetime import datetime
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship
+import os
+from sqlalchemy.pool import QueuePool
 from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, Boolean
-
-
-DB_PATH = 'data/homework_helper.db'
-engine = create_engine(f'sqlite:///{DB_PATH}', echo=False)
+from utils.db_connection import DB_PATH, get_connection, open_connection
+from utils.attempt_logger import log_attempt_row, flush_attempts
+
+SQLITE_ORM_POOL_SIZE = int(os.getenv("SQLITE_ORM_POOL_SIZE", "5"))
+SQLITE_ORM_MAX_OVERFLOW = int(os.getenv("SQLITE_ORM_MAX_OVERFLOW", "10"))
+
+# ORM sessions borrow a connection from utils/db_connection.py's open_connection() and return it
+# on close. The pool isn't tied to threads (Streamlit runs each rerun on a new one), and its
+# connections are separate from the raw-SQL helpers', so a helper's commit/rollback never
+# touches pending ORM work
+engine = create_engine(f'sqlite:///{DB_PATH}', creator=lambda: open_connection(check_same_thread=False),
+                       poolclass=QueuePool, pool_size=SQLITE_ORM_POOL_SIZE,
+                       max_overflow=SQLITE_ORM_MAX_OVERFLOW, echo=False)
 SessionLocal = sessionmaker(bind=engine)
 
 Base = declarative_base()
 
-def get_connection():
-    return sqlite3.connect(DB_PATH)
-
 def get_prompt_template(category: str, topic: str = None):
     """
     Retrieve a prompt_template from the prompts table.
     Falls back to category-only match if topic not found.
     """
-    from utils.db import get_connection
     conn = get_connection()
-    cur = conn.cursor()
-    if topic:
+    try:
+        cur = conn.cursor()
+        if topic:
+            cur.execute("""
+                SELECT prompt_template 
+                FROM prompts 
+                WHERE LOWER(category) = LOWER(?) 
+                  AND LOWER(topic) = LOWER(?)
+                LIMIT 1;
+            """, (category, topic))
+            row = cur.fetchone()
+            if row:
+                return row[0]
+
+        # fallback: just category
         cur.execute("""
             SELECT prompt_template 
             FROM prompts 
             WHERE LOWER(category) = LOWER(?) 
-              AND LOWER(topic) = LOWER(?)
-            LIMIT 1;
-        """, (category, topic))
+            ORDER BY id DESC LIMIT 1;
+        """, (category,))
         row = cur.fetchone()
-        if row:
-            return row[0]
-
-    # fallback: just category
-    cur.execute("""
-        SELECT prompt_template 
-        FROM prompts 
-        WHERE LOWER(category) = LOWER(?) 
-        ORDER BY id DESC LIMIT 1;
-    """, (category,))
-    row = cur.fetchone()
-    return row[0] if row else None
+        return row[0] if row else None
+    finally:
+        conn.close()
 
 def get_prompt_for_topic(conn, category, topic):
     cursor = conn.cursor()
@@ -111,7 +120,25 @@ class Topic(Base):
     last_seen_date = Column(DateTime, nullable=True)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "homework_helper.db")
+def save_passage_analysis(db, topic, original_text, analysis):
+    """
+    Save a learning session with its passage, comprehension questions and vocabulary words
+    (from llm_helpers.analyze_passage) in one transaction. Returns the saved Passage.
+    """
+    passage = Passage(
+        original_text=original_text,
+        simplified_text=analysis.simplified_text,
+        questions=[Question(question_text=q) for q in analysis.questions],
+        words=[Word(word=w, explanation=e) for w, e in analysis.vocabulary.items()],
+    )
+    session_obj = Session(topic=topic or "Untitled", passages=[passage])
+    try:
+        db.add(session_obj)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return passage
 
 def log_attempt(
     subject,
@@ -123,33 +150,10 @@ def log_attempt(
     hint_used=False,
     question_type="multiple_choice"
 ):
-    """Logs a learning attempt across any subject."""
-    # Ensure the attempts table exists
-    conn = conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-                CREATE TABLE IF NOT EXISTS attempts
-                (
-                    id               INTEGER PRIMARY KEY AUTOINCREMENT,
-                    subject          TEXT NOT NULL,
-                    topic            TEXT,
-                    question_type    TEXT,
-                    question_text    TEXT NOT NULL,
-                    user_answer      TEXT,
-                    correct_answer   TEXT,
-                    is_correct       BOOLEAN,
-                    hint_used        BOOLEAN   DEFAULT 0,
-                    difficulty_level TEXT      DEFAULT 'normal',
-                    attempt_date     TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                """)
-
-    # Insert the attempt
-    cur.execute("""
-        INSERT INTO attempts
-        (subject, topic, question_type, question_text, user_answer, correct_answer, is_correct, hint_used, attempt_date)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
+    """Logs a learning attempt across any subject.
+    The row is queued and written in a batch by utils/attempt_logger.py.
+    """
+    log_attempt_row((
         subject,
         topic,
         question_type,
@@ -161,11 +165,8 @@ def log_attempt(
         datetime.now()
     ))
 
-    # Commit and close cleanly
-    conn.commit()
-    conn.close()
-
 def fetch_attempts_summary():
+    flush_attempts()  # include answers still waiting in the log queue
     conn = conn = get_connection()
     cur = conn.cursor()
     cur.execute("""
@@ -182,6 +183,7 @@ def fetch_attempts_summary():
     return rows
 
 def fetch_recent_attempts(days=7):
+    flush_attempts()
     conn = conn = get_connection()
     cur = conn.cursor()
     cur.execute("""
@@ -193,5 +195,4 @@ def fetch_recent_attempts(days=7):
     rows = cur.fetchall()
     conn.close()
     return rows
-# Create tables
-Base.metadata.create_all(engine)
+# Tables are created and upgraded by utils/migrations.py when the first connection opens
@@ -0,0 +1,116 @@
+# ==============================
+# 🔌 Homework Helper - SQLite Connection Layer
+# ==============================
+# The one place that opens data/homework_helper.db. Every thread gets its own long-lived
+# connection (sqlite3 connections can't be shared across threads), configured once with
+# WAL, busy_timeout, synchronous=NORMAL, a larger page cache, mmap and a statement cache.
+# The SQLAlchemy engine in utils/db.py draws from a small queue pool of connections opened by
+# open_connection(check_same_thread=False) (same settings). A session checks one out and returns
+# it on close, so any Streamlit script thread can use it, and a raw-SQL helper's commit or
+# rollback can never commit or discard ORM work that is flushed but not yet committed.
+# (A flushed ORM transaction does hold SQLite's write lock until commit, so keep flush-to-commit
+# short: raw-SQL writes wait for it, up to busy_timeout.)
+#
+# The first connection in the process applies pending schema migrations (utils/migrations.py).
+#
+# get_connection() keeps the familiar open/close call pattern: close() just rolls back
+# anything left uncommitted and keeps the connection for the thread's next call.
+import os
+import sqlite3
+import threading
+
+DB_PATH = os.path.abspath(os.getenv(
+    "HOMEWORK_DB_PATH", os.path.join(os.path.dirname(__file__), "..", "data", "homework_helper.db")
+))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))  # page cache per connection
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "128"))
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))  # prepared statements kept per connection
+
+_local = threading.local()
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _configure(conn):
+    conn.execute("PRAGMA journal_mode=WAL")  # readers don't block the writer (persists in the file)
+    conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous=NORMAL")  # safe with WAL; skips an fsync per commit
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE_MB * 1024 * 1024}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+
+class PooledConnection:
+    """This thread's shared sqlite3 connection; close() only ends the caller's use of it."""
+
+    def __init__(self, conn):
+        object.__setattr__(self, "_conn", conn)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def close(self):
+        # A real close would discard uncommitted work; keep that contract for the next caller
+        if self._conn.in_transaction:
+            self._conn.rollback()
+        self._conn.row_factory = None
+
+
+def open_connection(check_same_thread=True):
+    """
+    A new, configured sqlite3 connection to the app database.
+    Pass check_same_thread=False for connections a pool hands to whichever thread asks
+    (the ORM engine's); the pool makes sure only one thread uses each at a time.
+    """
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=SQLITE_STATEMENT_CACHE,
+        check_same_thread=check_same_thread,
+    )
+    _configure(conn)
+    _ensure_schema(conn)
+    return conn
+
+
+def _thread_connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = open_connection()
+    return conn
+
+
+def _ensure_schema(conn):
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if not _schema_ready:
+            from utils.migrations import migrate
+            migrate(conn)
+            _schema_ready = True
+
+
+def get_connection():
+    """The calling thread's connection to the app database (call close() when done, as before)."""
+    return PooledConnection(_thread_connection())
+
+
+def close_thread_connection():
+    """Really close the calling thread's connection, e.g. before deleting or replacing the file."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _local.conn = None
+        conn.close()
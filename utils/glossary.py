@@ -0,0 +1,87 @@
+# ==============================
+# 📒 Homework Helper - Word Glossary
+# ==============================
+# Word explanations only need the sentences around the word, not the whole passage.
+# sentence_window() trims the context locally, and the `glossary` table remembers each
+# explanation under (word, hash of that window) so a repeated word in the same context
+# is answered instantly, across sessions.
+import hashlib
+import os
+import re
+import time
+
+from utils.db import get_connection
+
+GLOSSARY_WINDOW_RADIUS = int(os.getenv("GLOSSARY_WINDOW_RADIUS", "1"))  # sentences either side
+GLOSSARY_MAX_OCCURRENCES = int(os.getenv("GLOSSARY_MAX_OCCURRENCES", "2"))
+
+_SENTENCE_RE = re.compile(r"[^.!?\n]+(?:[.!?]+[\"')\]]*|\n|$)")
+
+
+# ---------- Context Windows ----------
+def split_sentences(text):
+    return [s.strip() for s in _SENTENCE_RE.findall(text or "") if s.strip()]
+
+
+def sentence_window(word, text, radius=GLOSSARY_WINDOW_RADIUS, max_occurrences=GLOSSARY_MAX_OCCURRENCES):
+    """
+    The sentences around the first `max_occurrences` uses of `word` in `text` (plus `radius`
+    sentences either side), joined in passage order. Falls back to the opening sentences
+    when the word doesn't appear.
+    """
+    sentences = split_sentences(text)
+    if not sentences:
+        return ""
+    # Match inflected forms too: "erode" finds "eroded", "erodes"
+    pattern = re.compile(r"\b" + re.escape(word.strip()) + r"\w*", re.IGNORECASE)
+    hits = [i for i, s in enumerate(sentences) if pattern.search(s)][:max_occurrences]
+    if not hits:
+        return " ".join(sentences[:2 * radius + 1])
+
+    keep = set()
+    for i in hits:
+        keep.update(range(max(0, i - radius), min(len(sentences), i + radius + 1)))
+    parts, previous = [], None
+    for i in sorted(keep):
+        if previous is not None and i != previous + 1:
+            parts.append("…")
+        parts.append(sentences[i])
+        previous = i
+    return " ".join(parts)
+
+
+def window_hash(window):
+    normalized = " ".join(window.split()).casefold()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+# ---------- Glossary Cache ----------
+def lookup(word, window):
+    """Stored explanation of `word` for this context window, or None."""
+    key = (word.strip().casefold(), window_hash(window))
+    conn = get_connection()
+    try:
+        row = conn.execute(
+            "SELECT explanation FROM glossary WHERE word = ? AND window_hash = ?", key
+        ).fetchone()
+        if row:
+            conn.execute("UPDATE glossary SET hit_count = hit_count + 1 WHERE word = ? AND window_hash = ?", key)
+            conn.commit()
+            return row[0]
+        return None
+    finally:
+        conn.close()
+
+
+def remember(word, window, explanation):
+    if not explanation or explanation.startswith("(LLM error"):
+        return
+    conn = get_connection()
+    try:
+        conn.execute("""
+            INSERT OR REPLACE INTO glossary (word, window_hash, explanation, created_at, hit_count)
+            VALUES (?, ?, ?, ?, 0)
+        """, (word.strip().casefold(), window_hash(window), explanation, time.time()))
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,363 @@
+# ==============================
+# 🔌 Homework Helper - LLM Backends
+# ==============================
+# Everything in utils/llm_helpers talks to the model through one of these backends:
+#   - OpenAIBackend: the real API (or any OpenAI-compatible server via base_url)
+#   - FakeBackend:   in-process stand-in with configurable latency and canned outputs
+#   - "local":       OpenAIBackend pointed at utils/llm_stub_server.py
+# Pick one with the LLM_BACKEND environment variable (openai | fake | local),
+# or call set_backend() from tests and benchmarks.
+import asyncio
+import contextlib
+import functools
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+try:
+    import tiktoken  # optional: exact token counts for budgets and estimates
+except ImportError:
+    tiktoken = None
+
+
+@dataclass
+class Completion:
+    """Text of one chat completion plus token usage when the backend reports it."""
+    text: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+
+
+# ---------- Latency Model ----------
+class LatencyModel:
+    """
+    Samples simulated response latency in seconds.
+    Spec strings: "0", "const:0.8", "uniform:0.3:1.5", "lognormal:<median>:<sigma>".
+    `slow_rate` of the samples are drawn from `slow_latency` instead, to inject slow responses.
+    """
+
+    def __init__(self, spec="0", slow_rate=0.0, slow_latency="const:5"):
+        self.spec = str(spec)
+        self.slow_rate = slow_rate
+        self._slow = LatencyModel(slow_latency) if slow_rate else None
+        parts = self.spec.split(":")
+        if _is_number(parts[0]):
+            kind, args = "const", [float(parts[0])]
+        else:
+            kind, args = parts[0], [float(p) for p in parts[1:]]
+        if kind == "const":
+            self._sample = lambda: args[0] if args else 0.0
+        elif kind == "uniform":
+            low, high = args
+            self._sample = lambda: random.uniform(low, high)
+        elif kind == "lognormal":
+            median, sigma = args
+            self._sample = lambda: random.lognormvariate(math.log(median), sigma)
+        else:
+            raise ValueError(f"Unknown latency distribution: {self.spec}")
+
+    def sample(self):
+        if self._slow is not None and random.random() < self.slow_rate:
+            return self._slow.sample()
+        return max(0.0, self._sample())
+
+
+def _is_number(s):
+    try:
+        float(s)
+        return True
+    except ValueError:
+        return False
+
+
+# ---------- Canned Outputs ----------
+@functools.lru_cache(maxsize=None)
+def _encoding(model):
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Unknown model name: count with the current OpenAI encoding
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # e.g. the encoding file can't be downloaded offline; remembered so we don't retry per call
+        return None
+
+
+def estimate_tokens(text, model=None):
+    """Token count from the local tokenizer when tiktoken is installed, else ~4 characters per token."""
+    if tiktoken is not None:
+        encoding = _encoding(model or "gpt-4o-mini")
+        if encoding is not None:
+            return max(1, len(encoding.encode(text, disallowed_special=())))
+    return max(1, len(text) // 4)
+
+
+def canned_response(messages):
+    """
+    Produce a plausible reply for the prompts this app sends, so the whole pipeline
+    (JSON parsing included) runs without a real model.
+    """
+    prompt = messages[-1]["content"] if messages else ""
+
+    if '"simplified_paragraphs"' in prompt:
+        paragraphs = re.search(r"\((\d+) paragraph", prompt)
+        return json.dumps({
+            "simplified_paragraphs": [
+                f"Here is a simpler way to say part {i + 1}. The main idea is easy to follow."
+                for i in range(int(paragraphs.group(1)) if paragraphs else 1)
+            ],
+            "questions": ["What is the passage mostly about?", "Why did it happen?", "What might happen next?"],
+            "vocabulary": [
+                {"word": "passage", "explanation": "A short piece of writing you read."},
+                {"word": "idea", "explanation": "A thought or plan in your mind."},
+            ],
+        })
+    if '"explanations"' in prompt:
+        return json.dumps({"explanations": [
+            {"word": w, "explanation": f"'{w}' is a word that fits the sentence it is in."}
+            for w in re.findall(r'(?m)^\s*- "([^"]+)" in:', prompt)
+        ]})
+    batch_ids = re.findall(r"(?m)^\s*(\d+)\. Sentence:", prompt)
+    if batch_ids:
+        return json.dumps({"questions": [
+            {
+                "id": int(i),
+                "prompt": f"Which word in sentence {i} is a noun?",
+                "options": ["dog", "ran", "quickly", "blue"],
+                "answer": "dog",
+            }
+            for i in batch_ids
+        ]})
+    if '"question"' in prompt:
+        topic = re.search(r'"topic":\s*"([^"]*)"', prompt)
+        topic = topic.group(1) if topic else "grammar"
+        question_set = re.search(r"Write (\d+) DIFFERENT questions", prompt)
+        questions = [
+            {
+                "topic": topic,
+                "question": f"Which sentence uses {topic.replace('_', ' ')} correctly?" + (f" ({i + 1})" if i else ""),
+                "options": ["The dog ran home.", "the dog ran home", "The dog, ran home", "dog The ran home."],
+                "answer": "The dog ran home.",
+            }
+            for i in range(int(question_set.group(1)) if question_set else 1)
+        ]
+        return json.dumps({"questions": questions} if question_set else questions[0])
+    if '"prompt"' in prompt:
+        return json.dumps({
+            "prompt": "Which word is the verb in the sentence?",
+            "options": ["jumped", "cat", "green", "softly"],
+            "answer": "jumped",
+        })
+    if "array of strings" in prompt:
+        return json.dumps({"sentences": [
+            "The cat slept on the sunny porch.",
+            "A blue bird landed on the fence.",
+            "We packed snacks for the short hike.",
+            "My brother kicked the ball over the wall.",
+            "The library was quiet on Monday morning.",
+        ]})
+    if "comprehension questions" in prompt:
+        return "1. What is the passage mostly about?\n2. Why did it happen?\n3. What might happen next?"
+    return (
+        "Here is a simpler way to say it. The main idea is easy to follow, "
+        "and each part builds on the one before it."
+    )
+
+
+class CannedResponses:
+    """Callable mapping prompts to replies: regex rules first, then canned_response()."""
+
+    def __init__(self, rules=None):
+        self.rules = [(re.compile(r["match"], re.S), r["response"]) for r in (rules or [])]
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def __call__(self, messages):
+        prompt = messages[-1]["content"] if messages else ""
+        for pattern, response in self.rules:
+            if pattern.search(prompt):
+                return response if isinstance(response, str) else json.dumps(response)
+        return canned_response(messages)
+
+
+# ---------- Backends ----------
+class LLMBackend:
+    """Interface every backend implements."""
+    name = "base"
+    # Whether complete()/acomplete() accept an OpenAI-style `response_format` (JSON schema) kwarg
+    supports_response_format = False
+
+    def complete(self, messages, model, temperature, **kwargs) -> Completion:
+        raise NotImplementedError
+
+    def stream(self, messages, model, temperature, **kwargs):
+        """Yield text chunks; kwargs (e.g. response_format) as for complete. Default: one chunk with the full completion."""
+        yield self.complete(messages, model, temperature, **kwargs).text
+
+    @contextlib.asynccontextmanager
+    async def async_session(self):
+        """Async context yielding an object with `acomplete`; one per event loop."""
+        yield self
+
+    async def acomplete(self, messages, model, temperature, **kwargs) -> Completion:
+        return await asyncio.to_thread(self.complete, messages, model, temperature, **kwargs)
+
+
+class OpenAIBackend(LLMBackend):
+    """The real OpenAI client, or any server speaking the chat-completions protocol via base_url."""
+    name = "openai"
+
+    def __init__(self, api_key=None, base_url=None):
+        from openai import OpenAI
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.base_url = base_url
+        # Retries are handled by utils/llm_resilience so they share one backoff and circuit breaker
+        self.client = OpenAI(api_key=self.api_key, base_url=base_url, max_retries=0)
+        # Some OpenAI-compatible servers reject json_schema response formats; LLM_JSON_SCHEMA=0 turns them off
+        self.supports_response_format = os.getenv("LLM_JSON_SCHEMA", "1") != "0"
+
+    def complete(self, messages, model, temperature, **kwargs):
+        resp = self.client.chat.completions.create(
+            model=model, messages=messages, temperature=temperature, **kwargs
+        )
+        usage = getattr(resp, "usage", None)
+        return Completion(
+            text=resp.choices[0].message.content.strip(),
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+        )
+
+    def stream(self, messages, model, temperature, **kwargs):
+        stream = self.client.chat.completions.create(
+            model=model, messages=messages, temperature=temperature, stream=True, **kwargs
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    @contextlib.asynccontextmanager
+    async def async_session(self):
+        # A fresh client per event loop: httpx connection pools cannot be shared across loops
+        from openai import AsyncOpenAI
+        async with AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0) as aclient:
+            yield _AsyncOpenAISession(aclient)
+
+
+class _AsyncOpenAISession:
+    def __init__(self, aclient):
+        self.aclient = aclient
+
+    async def acomplete(self, messages, model, temperature, **kwargs):
+        resp = await self.aclient.chat.completions.create(
+            model=model, messages=messages, temperature=temperature, **kwargs
+        )
+        usage = getattr(resp, "usage", None)
+        return Completion(
+            text=resp.choices[0].message.content.strip(),
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+        )
+
+
+class FakeAPIError(Exception):
+    """Simulated HTTP error from a stand-in backend (carries status_code like openai.APIStatusError)."""
+
+    def __init__(self, status_code, message="simulated error"):
+        super().__init__(f"{status_code} {message}")
+        self.status_code = status_code
+
+
+class FakeBackend(LLMBackend):
+    """
+    In-process stand-in: sleeps for a sampled latency, then returns a canned reply.
+    `responses` is a callable(messages) -> str; defaults to CannedResponses().
+    `error_rate` is the fraction of requests that fail with `error_status` (429 by default).
+    `slow_rate` of the requests take `slow_latency` instead (tail-latency experiments).
+    """
+    name = "fake"
+
+    def __init__(self, latency="0", responses=None, error_rate=0.0, error_status=429,
+                 slow_rate=0.0, slow_latency="const:5"):
+        self.latency = latency if isinstance(latency, LatencyModel) else LatencyModel(latency, slow_rate, slow_latency)
+        self.responses = responses or CannedResponses()
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _reply(self, messages):
+        with self._lock:
+            self.calls += 1
+        if self.error_rate and random.random() < self.error_rate:
+            raise FakeAPIError(self.error_status)
+        text = self.responses(messages).strip()
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        return Completion(text, prompt_tokens, estimate_tokens(text))
+
+    def complete(self, messages, model, temperature, **kwargs):
+        time.sleep(self.latency.sample())
+        return self._reply(messages)
+
+    def stream(self, messages, model, temperature, **kwargs):
+        delay = self.latency.sample()
+        # Spend a third of the latency before the first token, the rest spread over the words
+        time.sleep(delay / 3)
+        words = self._reply(messages).text.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(delay * 2 / 3 / len(words))
+            yield word if i == 0 else " " + word
+
+    async def acomplete(self, messages, model, temperature, **kwargs):
+        await asyncio.sleep(self.latency.sample())
+        return self._reply(messages)
+
+
+# ---------- Selection ----------
+LOCAL_SERVER_URL = os.getenv("LLM_BASE_URL", "http://127.0.0.1:8787/v1")
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def make_backend(kind=None):
+    kind = (kind or os.getenv("LLM_BACKEND", "openai")).lower()
+    if kind == "openai":
+        return OpenAIBackend(base_url=os.getenv("LLM_BASE_URL") or None)
+    if kind == "fake":
+        return FakeBackend(
+            latency=os.getenv("LLM_FAKE_LATENCY", "0"),
+            error_rate=float(os.getenv("LLM_FAKE_ERROR_RATE", "0")),
+            slow_rate=float(os.getenv("LLM_FAKE_SLOW_RATE", "0")),
+            slow_latency=os.getenv("LLM_FAKE_SLOW_LATENCY", "const:5"),
+        )
+    if kind == "local":
+        return OpenAIBackend(api_key=os.getenv("OPENAI_API_KEY") or "local", base_url=LOCAL_SERVER_URL)
+    raise ValueError(f"Unknown LLM_BACKEND: {kind}")
+
+
+def get_backend():
+    """The process-wide backend, created from LLM_BACKEND on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = make_backend()
+        return _backend
+
+
+def set_backend(backend):
+    """Swap the process-wide backend (tests, benchmarks). Returns the previous one."""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+        return previous
@@ -0,0 +1,115 @@
+# ==============================
+# ⏱️ Homework Helper - Offline LLM Pipeline Benchmark
+# ==============================
+# Measures wall-clock time and throughput of the generation pipeline against a
+# stand-in backend, so changes can be compared without network access.
+#
+# Usage:
+#   python -m utils.llm_bench --backend fake --latency lognormal:0.8:0.4 --questions 10 --rounds 3
+#   python -m utils.llm_bench --backend local --latency uniform:0.5:1.5   # spins up utils/llm_stub_server
+#   python -m utils.llm_bench --backend local --slow-rate 0.1 --hedge     # tail latency with hedged requests
+#   python -m utils.llm_bench --backend local --background 4              # interactive latency under batch load
+import argparse
+import statistics
+import threading
+import time
+
+
+def _timed(fn, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _background_load(workers, stop):
+    """Keep `workers` batch-priority fan-outs running until `stop` is set."""
+    from utils.llm_helpers import call_llm_many
+    from utils.llm_scheduler import llm_priority
+
+    def _loop(n):
+        with llm_priority("batch"):
+            while not stop.is_set():
+                call_llm_many([f"Background prompt {n}-{i}" for i in range(8)], use_cache=False)
+
+    threads = [threading.Thread(target=_loop, args=(n,), daemon=True) for n in range(workers)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def run_benchmark(backend="fake", latency="lognormal:0.8:0.4", questions=10, rounds=3,
+                  slow_rate=0.0, slow_latency="const:5", hedge=False, background=0):
+    from utils import llm_backends, llm_cache, llm_hedging, llm_scheduler
+
+    server = None
+    if backend == "fake":
+        llm_backends.set_backend(llm_backends.FakeBackend(latency=latency, slow_rate=slow_rate, slow_latency=slow_latency))
+    elif backend == "local":
+        from utils.llm_stub_server import start_in_background
+        server = start_in_background(port=0, latency=latency, slow_rate=slow_rate, slow_latency=slow_latency)
+        llm_backends.set_backend(llm_backends.OpenAIBackend(api_key="local", base_url=server.base_url))
+    else:
+        llm_backends.set_backend(llm_backends.make_backend(backend))
+
+    # Measure the model path, not the response cache
+    llm_cache.CACHE_ENABLED = False
+    llm_hedging.HEDGE_ENABLED = hedge
+
+    from utils.llm_helpers import call_llm, call_llm_many, generate_grammar_questions, simplify_text
+    sentences = [f"The {i} red foxes ran quickly across the field." for i in range(questions)]
+    passage = "The sun is a star at the center of our solar system. " * 20
+
+    cases = {
+        f"call_llm x{questions} (serial)": lambda: [call_llm(s) for s in sentences],
+        f"call_llm_many x{questions} (concurrent)": lambda: call_llm_many(sentences),
+        f"generate_grammar_questions x{questions} (batched)": lambda: generate_grammar_questions(sentences),
+        "simplify_text (one passage)": lambda: simplify_text(passage),
+    }
+
+    print(f"Backend: {backend}  latency: {latency}  slow: {slow_rate:.0%} at {slow_latency}  "
+          f"hedging: {'on' if hedge else 'off'}  background: {background}  rounds: {rounds}")
+    stop = threading.Event()
+    background_threads = _background_load(background, stop)
+    results = {}
+    for name, fn in cases.items():
+        timings = _timed(fn, rounds)
+        results[name] = timings
+        print(f"  {name:48} mean {statistics.mean(timings):6.2f}s   min {min(timings):6.2f}s   max {max(timings):6.2f}s")
+
+    stop.set()
+    for thread in background_threads:
+        thread.join()
+
+    if hedge:
+        print(f"  hedging: {llm_hedging.hedge_stats()}")
+    if background:
+        for row in llm_scheduler.scheduler_stats():
+            print(f"  scheduler {row['priority']:12} served {row['served']:5}   "
+                  f"p50 wait {row['p50_wait_ms'] or 0:7.1f}ms   p95 wait {row['p95_wait_ms'] or 0:7.1f}ms")
+    if server is not None:
+        print(f"  stand-in server handled {server.config.requests} requests")
+        server.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LLM pipeline against a stand-in backend.")
+    parser.add_argument("--backend", default="fake", choices=["fake", "local", "openai"])
+    parser.add_argument("--latency", default="lognormal:0.8:0.4")
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of responses that are slow")
+    parser.add_argument("--slow-latency", default="const:5")
+    parser.add_argument("--hedge", action="store_true", help="enable hedged requests (utils/llm_hedging)")
+    parser.add_argument("--background", type=int, default=0,
+                        help="batch-priority fan-outs to keep running while the cases are timed (utils/llm_scheduler)")
+    args = parser.parse_args()
+    run_benchmark(args.backend, args.latency, args.questions, args.rounds,
+                  args.slow_rate, args.slow_latency, args.hedge, args.background)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# ==============================
+# 💰 Homework Helper - Daily Token Budget
+# ==============================
+# Caps how many tokens the app spends per day, overall and per feature (the function that
+# called the model, as in telemetry). Usage is counted in the `llm_token_usage` table and
+# quotas live in `llm_token_quotas` (row "*" is the whole app); env vars supply the defaults:
+#   LLM_DAILY_TOKEN_BUDGET=1000000            tokens per day for everything (0 = no cap)
+#   LLM_FEATURE_TOKEN_BUDGETS="simplify_text=300000,generate_sentences_from_topics=100000"
+#
+# call_llm asks check() before each live request. Past LLM_BUDGET_SOFT_LIMIT of a quota the
+# request is "tight": a stored answer is served if there is one, else the passage in the prompt
+# is shortened (for callers that say which part may be cut).
+# Once a quota would be exceeded the request is refused with BudgetExceeded.
+import os
+from datetime import date
+
+from utils.db import get_connection
+
+ALL_FEATURES = "*"
+DAILY_TOKEN_BUDGET = int(os.getenv("LLM_DAILY_TOKEN_BUDGET", "1000000"))
+BUDGET_SOFT_LIMIT = float(os.getenv("LLM_BUDGET_SOFT_LIMIT", "0.9"))  # share of a quota after which calls degrade
+BUDGET_SHORT_PROMPT_TOKENS = int(os.getenv("LLM_BUDGET_SHORT_PROMPT_TOKENS", "1000"))  # prompt size when degraded
+
+
+def _parse_budgets(spec):
+    """"simplify_text=300000,explain_word=50000" -> {"simplify_text": 300000, ...}"""
+    budgets = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            budgets[name.strip()] = int(value)
+    return budgets
+
+
+FEATURE_TOKEN_BUDGETS = _parse_budgets(os.getenv("LLM_FEATURE_TOKEN_BUDGETS", ""))
+
+OK, TIGHT, EXHAUSTED = "ok", "tight", "exhausted"
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+# ---------- Quotas ----------
+def get_quotas():
+    """{feature: daily tokens}; stored quotas override the env defaults. 0 means no cap."""
+    quotas = {ALL_FEATURES: DAILY_TOKEN_BUDGET, **FEATURE_TOKEN_BUDGETS}
+    conn = get_connection()
+    try:
+        quotas.update(dict(conn.execute("SELECT feature, daily_tokens FROM llm_token_quotas").fetchall()))
+    finally:
+        conn.close()
+    return quotas
+
+
+def set_quota(feature, daily_tokens):
+    """Persist a daily quota for `feature` ("*" for the whole app); None removes the stored override."""
+    conn = get_connection()
+    try:
+        if daily_tokens is None:
+            conn.execute("DELETE FROM llm_token_quotas WHERE feature = ?", (feature,))
+        else:
+            conn.execute("""
+                INSERT INTO llm_token_quotas (feature, daily_tokens) VALUES (?, ?)
+                ON CONFLICT(feature) DO UPDATE SET daily_tokens = excluded.daily_tokens
+            """, (feature, int(daily_tokens)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# ---------- Usage ----------
+def usage_today():
+    """{feature: tokens used today}, plus "*" for the total."""
+    conn = get_connection()
+    try:
+        rows = conn.execute(
+            "SELECT feature, tokens FROM llm_token_usage WHERE day = ?", (date.today().isoformat(),)
+        ).fetchall()
+    finally:
+        conn.close()
+    usage = dict(rows)
+    usage[ALL_FEATURES] = sum(usage.values())
+    return usage
+
+
+def record_usage(feature, tokens):
+    """Add the tokens of one completed request to today's count."""
+    if not tokens:
+        return
+    try:
+        conn = get_connection()
+        try:
+            conn.execute("""
+                INSERT INTO llm_token_usage (day, feature, tokens, calls) VALUES (?, ?, ?, 1)
+                ON CONFLICT(day, feature) DO UPDATE SET tokens = tokens + excluded.tokens, calls = calls + 1
+            """, (date.today().isoformat(), feature or "unknown", int(tokens)))
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        # Losing one count must never break a lesson
+        print(f"LLM budget write failed: {e}")
+
+
+def check(feature, estimated_tokens):
+    """OK, TIGHT or EXHAUSTED for sending a request of ~estimated_tokens on behalf of `feature`."""
+    quotas, usage = get_quotas(), usage_today()
+    state = OK
+    for scope in (ALL_FEATURES, feature):
+        quota = quotas.get(scope) or 0
+        if quota <= 0:
+            continue
+        after = usage.get(scope, 0) + estimated_tokens
+        if after > quota:
+            return EXHAUSTED
+        if after > quota * BUDGET_SOFT_LIMIT:
+            state = TIGHT
+    return state
+
+
+def budget_report():
+    """Today's usage against each quota, for the Reports page."""
+    quotas, usage = get_quotas(), usage_today()
+    rows = []
+    for feature in sorted(set(quotas) | set(usage), key=lambda f: (f != ALL_FEATURES, f)):
+        quota = quotas.get(feature) or 0
+        used = usage.get(feature, 0)
+        rows.append({
+            "feature": "all features" if feature == ALL_FEATURES else feature,
+            "tokens_today": used,
+            "daily_quota": quota or None,
+            "used_pct": round(100 * used / quota, 1) if quota else None,
+        })
+    return rows
+
+
+# ---------- Degrading ----------
+def shorten_prompt(prompt, trimmable, max_tokens=BUDGET_SHORT_PROMPT_TOKENS):
+    """
+    Cut `trimmable` (the passage or other material inside `prompt`) at a sentence end so the
+    whole prompt is about max_tokens. The instructions around it are kept as they are.
+    """
+    from utils.llm_backends import estimate_tokens
+    if not trimmable or trimmable not in prompt or estimate_tokens(prompt) <= max_tokens:
+        return prompt
+    room = max(0, max_tokens - estimate_tokens(prompt.replace(trimmable, "", 1))) * 4  # ~4 characters per token
+    cut = trimmable[:room]
+    end = max(cut.rfind(". "), cut.rfind(".\n"), cut.rfind("? "), cut.rfind("! "))
+    if end > room // 2:
+        cut = cut[:end + 1]
+    return prompt.replace(trimmable, cut.rstrip(), 1)
@@ -0,0 +1,191 @@
+# ==============================
+# 🗄️ Homework Helper - LLM Response Cache
+# ==============================
+# Disk-backed, content-addressed cache for chat completions.
+# Responses are stored in the `llm_cache` table keyed by a hash of
+# (model, temperature, system prompt, user prompt), expire after a TTL,
+# and the least recently used rows are evicted once the table grows too large.
+# Hits update last_used_at/hit_count in batches (see _touch) so a read doesn't take the write lock.
+import hashlib
+import json
+import os
+import threading
+import time
+
+from utils.db import get_connection
+
+CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+CACHE_TOUCH_BATCH = int(os.getenv("LLM_CACHE_TOUCH_BATCH", "50"))
+CACHE_TOUCH_INTERVAL = float(os.getenv("LLM_CACHE_TOUCH_INTERVAL", "30"))
+
+_stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+
+# key -> [last_used_at, hits] not yet written to llm_cache
+_touches = {}
+_touches_lock = threading.Lock()
+_last_touch_flush = time.monotonic()
+
+
+def _bump(counter, amount=1):
+    with _stats_lock:
+        _stats[counter] += amount
+
+
+def make_key(model, temperature, system_prompt, prompt):
+    """Content address for a completion request."""
+    payload = json.dumps([model, float(temperature), system_prompt or "", prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_cached(key):
+    """Return the cached response for `key`, or None on a miss or expired entry."""
+    if not CACHE_ENABLED:
+        return None
+    conn = get_connection()
+    try:
+        row = conn.execute(
+            "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        now = time.time()
+        if row and now - row[1] <= CACHE_TTL_SECONDS:
+            _bump("hits")
+            _touch(key, now)
+            return row[0]
+        # Expired rows stay until LRU eviction or purge_expired(): get_stale() may still serve them
+        _bump("misses")
+        return None
+    finally:
+        conn.close()
+
+
+def _touch(key, now):
+    """Note a hit; pending hits are written together once enough pile up or enough time has passed."""
+    global _last_touch_flush
+    with _touches_lock:
+        pending = _touches.setdefault(key, [now, 0])
+        pending[0] = now
+        pending[1] += 1
+        due = (len(_touches) >= CACHE_TOUCH_BATCH
+               or time.monotonic() - _last_touch_flush >= CACHE_TOUCH_INTERVAL)
+    if due:
+        flush_touches()
+
+
+def flush_touches():
+    """Write pending last_used_at/hit_count updates in one transaction."""
+    global _last_touch_flush
+    with _touches_lock:
+        batch = [(used, hits, key) for key, (used, hits) in _touches.items()]
+        _touches.clear()
+        _last_touch_flush = time.monotonic()
+    if not batch:
+        return
+    conn = get_connection()
+    try:
+        conn.executemany(
+            "UPDATE llm_cache SET last_used_at = MAX(last_used_at, ?), hit_count = hit_count + ? WHERE key = ?",
+            batch,
+        )
+        conn.commit()
+    except Exception as e:
+        print(f"LLM cache touch failed: {e}")
+    finally:
+        conn.close()
+
+
+def get_stale(key):
+    """Return a stored response regardless of age; used as a fallback when the model is unreachable."""
+    if not CACHE_ENABLED:
+        return None
+    conn = get_connection()
+    try:
+        row = conn.execute("SELECT response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+
+def put_cached(key, model, response):
+    """Store a response and evict least recently used rows beyond CACHE_MAX_ENTRIES."""
+    if not CACHE_ENABLED or not response:
+        return
+    flush_touches()  # so eviction sees recent hits
+    conn = get_connection()
+    try:
+        now = time.time()
+        conn.execute("""
+            INSERT INTO llm_cache (key, model, response, created_at, last_used_at, hit_count)
+            VALUES (?, ?, ?, ?, ?, 0)
+            ON CONFLICT(key) DO UPDATE SET response = excluded.response,
+                                           created_at = excluded.created_at,
+                                           last_used_at = excluded.last_used_at
+        """, (key, model, response, now, now))
+        _bump("writes")
+
+        (count,) = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        overflow = count - CACHE_MAX_ENTRIES
+        if overflow > 0:
+            conn.execute("""
+                DELETE FROM llm_cache
+                WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used_at ASC LIMIT ?)
+            """, (overflow,))
+            _bump("evictions", overflow)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def drop_cached(key):
+    """Remove one entry, e.g. a stored reply that turned out not to parse."""
+    if not CACHE_ENABLED or not key:
+        return
+    with _touches_lock:
+        _touches.pop(key, None)
+    conn = get_connection()
+    try:
+        conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def purge_expired():
+    """Delete every entry older than the TTL. Returns the number of rows removed."""
+    conn = get_connection()
+    try:
+        cur = conn.execute(
+            "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - CACHE_TTL_SECONDS,)
+        )
+        conn.commit()
+        return cur.rowcount
+    finally:
+        conn.close()
+
+
+def clear_cache():
+    with _touches_lock:
+        _touches.clear()
+    conn = get_connection()
+    try:
+        conn.execute("DELETE FROM llm_cache")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def cache_stats():
+    """Process-wide hit/miss counters plus the current number of stored entries."""
+    conn = get_connection()
+    try:
+        (entries,) = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+    finally:
+        conn.close()
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["entries"] = entries
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+    return stats
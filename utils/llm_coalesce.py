@@ -0,0 +1,111 @@
+# ==============================
+# 🔗 Homework Helper - Request Coalescing (single-flight)
+# ==============================
+# When several Streamlit sessions ask for the same completion at the same moment (a class
+# opening the same passage), only the first request goes to the model; the others wait on
+# its result instead of starting duplicates. Shared by threads and event loops.
+#
+# Followers get the leader's result or ordinary error. If the leader is cancelled or interrupted
+# instead (e.g. its call_llm_many timeout fired), that says nothing about the request, so the
+# waiting followers elect a new leader and try again rather than inheriting the cancellation.
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from utils.llm_resilience import LLMUnavailable
+
+
+class LeaderAbandoned(LLMUnavailable):
+    """The leading request was cancelled before it finished; followers retry on their own."""
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "coalesced": 0}
+
+    def _claim(self, key):
+        """(True, new future) for the first caller with `key`, else (False, the leader's future)."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                return False, future
+            future = Future()
+            self._inflight[key] = future
+            self._stats["leaders"] += 1
+            return True, future
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _abandon(self, key, future, error):
+        # CancelledError, KeyboardInterrupt, ...: re-raised in the leader only
+        self._finish(key, future, error=LeaderAbandoned(f"leading request abandoned: {type(error).__name__}"))
+
+    def do(self, key, fn):
+        """Run fn() once per key at a time; concurrent callers get the same result (or exception)."""
+        while True:
+            leader, future = self._claim(key)
+            if leader:
+                break
+            try:
+                return future.result()
+            except LeaderAbandoned:
+                continue
+        try:
+            result = fn()
+        except Exception as e:
+            self._finish(key, future, error=e)
+            raise
+        except BaseException as e:
+            self._abandon(key, future, e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    async def ado(self, key, coro_fn):
+        """Async twin of do(); coalesces with both coroutines and threads."""
+        while True:
+            leader, future = self._claim(key)
+            if leader:
+                break
+            try:
+                # shield: a follower's own cancellation must not cancel the shared future
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except LeaderAbandoned:
+                continue
+        try:
+            result = await coro_fn()
+        except Exception as e:
+            self._finish(key, future, error=e)
+            raise
+        except BaseException as e:
+            self._abandon(key, future, e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._inflight)
+        return stats
+
+
+_single_flight = SingleFlight()
+
+
+def get_single_flight():
+    return _single_flight
+
+
+def coalesce_stats():
+    """How many requests went to the model (leaders) vs. waited on an identical one (coalesced)."""
+    return _single_flight.stats()
@@ -0,0 +1,225 @@
+# ==============================
+# 🪃 Homework Helper - Hedged LLM Requests
+# ==============================
+# Cuts tail latency: when a request hasn't answered within the LLM_HEDGE_PERCENTILE of recent
+# latency for its feature (capped at LLM_HEDGE_MAX_MULTIPLE x the median, so the trigger still
+# fires when more than 5% of requests are slow), a duplicate is sent and whichever finishes first wins.
+# Latency samples are seeded from the llm_calls telemetry, so hedging works right after a restart.
+#
+# Hedges cost tokens: every request earns LLM_HEDGE_BUDGET of its estimated tokens as hedge
+# allowance for its feature, and a hedge spends its own estimate. A duplicate is only sent when
+# the allowance covers it, a scheduler slot is free right now, the rate limiter has room and the
+# daily token budget isn't tight; its tokens are charged to the daily budget.
+#
+# Off by default (LLM_HEDGE_ENABLED=1 to turn on). Try it offline against injected slow responses:
+#   python -m utils.llm_bench --backend local --slow-rate 0.1 --hedge
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utils import llm_budget
+from utils.llm_resilience import get_rate_limiter
+from utils.llm_scheduler import get_scheduler
+from utils.llm_telemetry import percentile, recent_latencies
+
+HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+HEDGE_MAX_MULTIPLE = float(os.getenv("LLM_HEDGE_MAX_MULTIPLE", "3"))  # hedge delay never exceeds this x the median
+HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "5"))  # no hedging until we know the feature's latency
+HEDGE_WINDOW = int(os.getenv("LLM_HEDGE_WINDOW", "200"))  # recent requests per feature
+HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.05"))  # share of a feature's tokens that may go to hedges
+HEDGE_BURST = float(os.getenv("LLM_HEDGE_BURST", "2"))  # hedges' worth of allowance a feature may bank
+HEDGE_WORKERS = int(os.getenv("LLM_HEDGE_WORKERS", "16"))
+
+
+def _parse_budgets(spec):
+    """"simplify_text=0.1,generate_grammar_questions=0" -> {"simplify_text": 0.1, ...}"""
+    budgets = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            budgets[name.strip()] = float(value)
+    return budgets
+
+
+# Per-feature overrides of HEDGE_BUDGET
+HEDGE_BUDGETS = _parse_budgets(os.getenv("LLM_HEDGE_BUDGETS", ""))
+
+
+class HedgePolicy:
+    """Rolling per-feature latency samples and hedge token allowance."""
+
+    def __init__(self, window=HEDGE_WINDOW, seed=True):
+        self.window = window
+        self.seed = seed
+        self.latencies = {}
+        self.allowance = {}  # feature -> tokens available for hedges
+        self.stats = {"requests": 0, "hedged": 0, "hedge_wins": 0}
+        self.lock = threading.Lock()
+
+    def _samples(self, feature):
+        """The feature's latency window (lock held), seeded from telemetry on first use."""
+        samples = self.latencies.get(feature)
+        if samples is None:
+            samples = self.latencies[feature] = deque(maxlen=self.window)
+            if self.seed:
+                try:
+                    samples.extend(recent_latencies(feature, self.window))
+                except Exception as e:
+                    print(f"Hedge latency seed failed: {e}")
+        return samples
+
+    def record_latency(self, feature, seconds):
+        with self.lock:
+            self._samples(feature).append(seconds)
+
+    def hedge_delay(self, feature):
+        """Seconds to wait before hedging, or None while there are too few samples."""
+        with self.lock:
+            samples = list(self._samples(feature))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return min(percentile(samples, HEDGE_PERCENTILE), HEDGE_MAX_MULTIPLE * percentile(samples, 50))
+
+    def start_request(self, feature, estimated_tokens):
+        """Count a request and credit its share of tokens to the feature's hedge allowance."""
+        budget = HEDGE_BUDGETS.get(feature, HEDGE_BUDGET)
+        with self.lock:
+            # A new feature starts with one hedge's worth, so the first slow request can be hedged
+            current = self.allowance.get(feature, estimated_tokens if budget > 0 else 0)
+            self.allowance[feature] = min(HEDGE_BURST * estimated_tokens, current + budget * estimated_tokens)
+            self.stats["requests"] += 1
+
+    def try_hedge(self, feature, estimated_tokens):
+        """Spend a hedge's tokens from the feature's allowance; False if it can't cover one."""
+        with self.lock:
+            if self.allowance.get(feature, 0) < estimated_tokens:
+                return False
+            self.allowance[feature] -= estimated_tokens
+            self.stats["hedged"] += 1
+            return True
+
+    def refund(self, feature, estimated_tokens):
+        """A hedge approved by try_hedge was not sent after all."""
+        with self.lock:
+            self.allowance[feature] = self.allowance.get(feature, 0) + estimated_tokens
+            self.stats["hedged"] -= 1
+
+    def record_win(self):
+        with self.lock:
+            self.stats["hedge_wins"] += 1
+
+
+_policy = HedgePolicy()
+_pool = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+
+
+def hedge_stats():
+    with _policy.lock:
+        return dict(_policy.stats)
+
+
+def _acquire_hedge(feature, estimated_tokens):
+    """
+    Everything a duplicate request needs, taken without waiting: the daily token budget, the hedge
+    allowance, a scheduler slot and rate-limit room. Returns the slot to release once the
+    duplicate finishes, or None when it must not be sent.
+    """
+    if llm_budget.check(feature, estimated_tokens) != llm_budget.OK:
+        return None
+    if not _policy.try_hedge(feature, estimated_tokens):
+        return None
+    slot = get_scheduler().try_acquire()
+    if slot is None or not get_rate_limiter().try_acquire(estimated_tokens):
+        if slot is not None:
+            get_scheduler().release(slot)
+        _policy.refund(feature, estimated_tokens)
+        return None
+    # The winner's usage is recorded by the caller; this pays for the extra request
+    llm_budget.record_usage(feature, estimated_tokens)
+    return slot
+
+
+def _timed(fn, feature):
+    started = time.monotonic()
+    result = fn()
+    _policy.record_latency(feature, time.monotonic() - started)
+    return result
+
+
+def hedged_call(fn, feature, estimated_tokens):
+    """Run fn() (one model request); send a duplicate if it runs past the feature's hedge delay."""
+    if not HEDGE_ENABLED:
+        return fn()
+    _policy.start_request(feature, estimated_tokens)
+    delay = _policy.hedge_delay(feature)
+    if delay is None:
+        return _timed(fn, feature)
+
+    primary = _pool.submit(_timed, fn, feature)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+    slot = _acquire_hedge(feature, estimated_tokens)
+    if slot is None:
+        return primary.result()
+
+    backup = _pool.submit(_timed, fn, feature)
+    # The duplicate keeps its scheduler slot until it finishes, even when it loses
+    backup.add_done_callback(lambda _: get_scheduler().release(slot))
+    pending, errors = {primary, backup}, []
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                # The loser can't be interrupted; its result is simply dropped
+                if future is backup:
+                    _policy.record_win()
+                return future.result()
+            errors.append(future.exception())
+    raise errors[0]
+
+
+async def ahedged_call(coro_fn, feature, estimated_tokens):
+    """Async twin of hedged_call; the losing request is cancelled."""
+    if not HEDGE_ENABLED:
+        return await coro_fn()
+    _policy.start_request(feature, estimated_tokens)
+    delay = _policy.hedge_delay(feature)
+
+    async def timed():
+        started = time.monotonic()
+        result = await coro_fn()
+        _policy.record_latency(feature, time.monotonic() - started)
+        return result
+
+    if delay is None:
+        return await timed()
+
+    primary = asyncio.ensure_future(timed())
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        return await primary
+    slot = _acquire_hedge(feature, estimated_tokens)
+    if slot is None:
+        return await primary
+
+    backup = asyncio.ensure_future(timed())
+    backup.add_done_callback(lambda _: get_scheduler().release(slot))
+    pending, errors = {primary, backup}, []
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is backup:
+                        _policy.record_win()
+                    return task.result()
+                errors.append(task.exception())
+        raise errors[0]
+    finally:
+        for task in pending:
+            task.cancel()
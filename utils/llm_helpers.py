@@ -6,81 +6,822 @@
 # and grammar-related sentence/question generation.
 from typing import Any
 from jedi.api.classes import defined_names
-from openai import OpenAI
-import os, yaml, re, json
+import os, sys, time, yaml, re, json, asyncio, threading, itertools, contextvars, queue
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 import streamlit as st
-from utils.concept_map_loader import load_concept_map, detect_category_for_topic, get_question_focus
+from utils.concept_map_loader import load_concept_map
 from utils.db import get_prompt_template
+from utils.llm_cache import make_key, get_cached, get_stale, put_cached, drop_cached
+from utils.llm_backends import get_backend, estimate_tokens
+from utils import llm_telemetry
+from utils.llm_telemetry import record_call, tag
+from utils.llm_router import get_router, route_model
+from utils.llm_scheduler import current_priority, get_scheduler, llm_priority
+from utils import llm_budget
+from utils.llm_budget import BudgetExceeded
+from utils.llm_structured import (
+    SENTENCES_SCHEMA, GRAMMAR_QUESTION_SCHEMA, GRAMMAR_QUESTION_BATCH_SCHEMA, TOPIC_QUESTION_SCHEMA, TOPIC_QUESTION_SET_SCHEMA,
+    PASSAGE_ANALYSIS_SCHEMA, WORD_EXPLANATIONS_SCHEMA, json_schema_format, extract_json, unwrap_list,
+    parse_grammar_question, parse_word_explanations, TopicQuestion, PassageAnalysis, JSONArrayItemStream,
+)
+from utils import glossary, paragraph_cache
+from utils.llm_resilience import guarded_call, guarded_acall, estimate_request_tokens
+from utils.llm_coalesce import get_single_flight
+from utils.llm_hedging import hedged_call, ahedged_call
 
 
 # ---------- Setup ----------
-load_dotenv()
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+load_dotenv()  # before the backend is created so OPENAI_API_KEY / LLM_BACKEND are visible
 yaml_path = os.path.join("data", "grammar_hints.yaml")
 DEBUG = False  # Set to False to disable debug logs
-
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "5"))  # parallel requests per fan-out
+LLM_TASK_TIMEOUT = float(os.getenv("LLM_TASK_TIMEOUT", "45"))  # seconds per request in a fan-out
+SIMPLIFY_CHUNK_CHARS = int(os.getenv("SIMPLIFY_CHUNK_CHARS", "3000"))  # longer passages are simplified in parts
+SIMPLIFY_WORKERS = int(os.getenv("SIMPLIFY_WORKERS", "4"))  # parts simplified at once
+QUESTION_SOURCE_CHARS = int(os.getenv("QUESTION_SOURCE_CHARS", "12000"))  # most text a long passage's questions are written from
+
+
+# ---------- Call Accounting ----------
+# How many LLM requests each public function has issued in this process (cache hits included).
+# Tests can reset and inspect this to catch accidental extra round-trips.
+_llm_call_counts = Counter()
+_llm_call_counts_lock = threading.Lock()
+_LLM_PLUMBING = {"call_llm", "call_llm_json", "call_llm_many", "stream_llm"}
+
+def _caller_name():
+    """Name of the nearest function on the stack that isn't LLM plumbing or a private helper here."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        name = frame.f_code.co_name
+        internal = frame.f_globals.get("__name__") == __name__ and (name.startswith("_") or name in _LLM_PLUMBING)
+        if not internal:
+            return name
+        frame = frame.f_back
+    return "unknown"
+
+def _count_llm_calls(feature, n=1):
+    with _llm_call_counts_lock:
+        _llm_call_counts[feature] += n
+
+def get_llm_call_counts():
+    """Snapshot of {function name: number of LLM requests}."""
+    with _llm_call_counts_lock:
+        return dict(_llm_call_counts)
+
+def reset_llm_call_counts():
+    with _llm_call_counts_lock:
+        _llm_call_counts.clear()
 
 # ---------- Core LLM Wrapper ----------
-def call_llm(prompt, model='gpt-4o-mini', temperature=0.2): #TODO: add subject as parameter (e.g. Math, grammar, etc)
-    """Generic LLM call handler."""
+TUTOR_SYSTEM_PROMPT = 'You are a patient tutor for a 5th grader. Always explain clearly and simply. Do not give direct answers initially. Let the student work the questions out.'
+
+def call_llm(prompt, model=None, temperature=0.2, system_prompt=TUTOR_SYSTEM_PROMPT, use_cache=True, fallback=None, feature=None, response_format=None, task=None, trimmable=None): #TODO: add subject as parameter (e.g. Math, grammar, etc)
+    """Generic LLM call handler.
+    Identical requests are answered from the on-disk response cache (see utils/llm_cache.py);
+    pass use_cache=False where a fresh completion is wanted on every call.
+    Requests are rate limited, retried and circuit-broken by utils/llm_resilience.py. When the
+    model can't be reached the caller gets a stale cached answer if one exists, else `fallback`
+    (pass "" from JSON callers), else an "(LLM error: ...)" message for display.
+    Every call is logged to llm_calls under `feature` (default: the calling function's name);
+    JSON callers report parse success with llm_telemetry.mark_parsed(text, ok).
+    `response_format` (see llm_structured.json_schema_format) is sent when the backend supports it.
+    Cacheable requests that are already in flight elsewhere in the process wait for that
+    request instead of sending a duplicate (utils/llm_coalesce.py).
+    Without an explicit `model`, the model router picks one for the `task` type
+    (simplify, questions, explain_word, grammar_mcq, ...; see utils/llm_router.py).
+    Live requests count against the daily token budget (utils/llm_budget.py). Near a quota a
+    stored answer is preferred and `trimmable` (the passage inside `prompt`) may be shortened;
+    past it the caller gets the usual fallback.
+    """
+    feature = feature or _caller_name()
+    _count_llm_calls(feature)
+    models = _cache_models(model, task)
+    model = models[0]
+    started = time.perf_counter()
+    if use_cache:
+        hit_key, cached = _find_cached(get_cached, models, temperature, system_prompt, prompt)
+        if cached is not None:
+            if DEBUG: st.write("DEBUG: LLM cache hit")
+            return _keyed(tag(cached, record_call(feature, model, time.perf_counter() - started, cache_hit=True)), hit_key)
+
+    try:
+        sent_prompt, stored = _apply_budget(prompt, trimmable, models, temperature, system_prompt, feature)
+    except BudgetExceeded as e:
+        record_call(feature, model, time.perf_counter() - started, error=e)
+        return _llm_fallback(models, temperature, system_prompt, prompt, fallback, e)
+    if stored is not None:
+        return tag(stored, record_call(feature, model, time.perf_counter() - started, cache_hit=True))
+    prompt = sent_prompt
+    cache_key = make_key(model, temperature, system_prompt, prompt) if use_cache else None
+
+    messages = _build_messages(prompt, system_prompt)
+    complete = lambda: _complete_llm(messages, model, temperature, response_format, feature, started, cache_key, task)
     try:
         if DEBUG: st.write(f"DEBUG: LLM call with prompt: ")
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[
-                {'role': 'system', 'content': 'You are a patient tutor for a 5th grader. Always explain clearly and simply. Do not give direct answers initially. Let the student work the questions out.'},
-                {'role': 'user', 'content': prompt}
-            ],
-            temperature=temperature
-        )
-        return resp.choices[0].message.content.strip()
+        if not cache_key:
+            return complete()
+        return get_single_flight().do(_flight_key(models, temperature, system_prompt, prompt), complete)
+    except Exception as e:
+        return _llm_fallback(models, temperature, system_prompt, prompt, fallback, e)
+
+def _complete_llm(messages, model, temperature, response_format, feature, started, cache_key, task=None):
+    """One guarded model request: logs telemetry, fills the cache, returns tagged text or raises."""
+    backend = get_backend()
+    extra = _backend_kwargs(backend, response_format)
+    estimated = estimate_request_tokens(messages, model)
+    try:
+        with get_scheduler().slot():
+            completion = guarded_call(
+                lambda: hedged_call(lambda: backend.complete(messages, model, temperature, **extra), feature, estimated),
+                estimated,
+            )
+    except Exception as e:
+        record_call(feature, model, time.perf_counter() - started, error=e)
+        get_router().record(task, model, error=True)
+        raise
+    return _finish_completion(completion, model, feature, started, cache_key, task)
+
+def _finish_completion(completion, model, feature, started, cache_key, task=None):
+    latency = time.perf_counter() - started
+    call_id = record_call(feature, model, latency, completion.prompt_tokens, completion.completion_tokens)
+    llm_budget.record_usage(feature, (completion.prompt_tokens or 0) + (completion.completion_tokens or 0))
+    get_router().record(task, model, latency, completion.prompt_tokens, completion.completion_tokens)
+    if cache_key:
+        put_cached(cache_key, model, completion.text)
+    text = _keyed(tag(completion.text, call_id), cache_key)
+    if task and isinstance(text, llm_telemetry.LLMText):
+        text.route = (task, model)  # lets mark_parsed credit the router's candidate
+    return text
+
+def _keyed(text, cache_key):
+    """Remember which cache entry a reply lives in, so mark_parsed can drop it."""
+    if not cache_key or not text:
+        return text
+    if not isinstance(text, llm_telemetry.LLMText):
+        text = llm_telemetry.LLMText(text)
+    text.cache_key = cache_key
+    return text
+
+def mark_parsed(text, ok):
+    """
+    Report whether a structured reply parsed/validated, to telemetry and to the model router.
+    A reply that failed is also removed from the response cache, so asking again reaches the model.
+    """
+    llm_telemetry.mark_parsed(text, ok)
+    get_router().record_parse(getattr(text, "route", None), ok)
+    if not ok:
+        drop_cached(getattr(text, "cache_key", None))
+
+def _cache_models(model, task):
+    """
+    Models whose stored answers can serve a request, the one to call first.
+    A caller-chosen model only matches itself. When the router chooses, answers cached under any
+    of the task's candidates count, so an exploration pick or a route switch doesn't miss them.
+    """
+    if model:
+        return [model]
+    model = route_model(task)
+    return [model] + [m for m in get_router().candidates(task) if m != model]
+
+def _lookup_cached(get, models, temperature, system_prompt, prompt):
+    """First answer `get` (get_cached or get_stale) finds under any of `models`."""
+    return _find_cached(get, models, temperature, system_prompt, prompt)[1]
+
+def _find_cached(get, models, temperature, system_prompt, prompt):
+    """Like _lookup_cached, returning (key, answer); (None, None) on a miss."""
+    for model in models:
+        key = make_key(model, temperature, system_prompt, prompt)
+        found = get(key)
+        if found is not None:
+            return key, found
+    return None, None
+
+def _flight_key(models, temperature, system_prompt, prompt):
+    """Single-flight key: the same for every routed pick of one task, so they share one request."""
+    return make_key("|".join(sorted(models)), temperature, system_prompt, prompt)
+
+def _apply_budget(prompt, trimmable, models, temperature, system_prompt, feature):
+    """
+    Check one live request against the daily token budget (`models` as from _cache_models).
+    Returns (prompt to send, stored answer or None); raises BudgetExceeded when nothing fits.
+    """
+    estimate = lambda p: estimate_request_tokens(_build_messages(p, system_prompt), models[0])
+    state = llm_budget.check(feature, estimate(prompt))
+    if state == llm_budget.OK:
+        return prompt, None
+    stored = _lookup_cached(get_stale, models, temperature, system_prompt, prompt)
+    if stored is not None:
+        if DEBUG: st.write(f"DEBUG: token budget {state} for {feature}; serving stored answer")
+        return prompt, stored
+    shorter = llm_budget.shorten_prompt(prompt, trimmable)
+    if state == llm_budget.EXHAUSTED and llm_budget.check(feature, estimate(shorter)) == llm_budget.EXHAUSTED:
+        raise BudgetExceeded(f"today's token budget for {feature} is used up")
+    if DEBUG: st.write(f"DEBUG: token budget {state} for {feature}; prompt {len(prompt)} -> {len(shorter)} chars")
+    return shorter, None
+
+def _backend_kwargs(backend, response_format):
+    if response_format and backend.supports_response_format:
+        return {"response_format": response_format}
+    return {}
+
+def _build_messages(prompt, system_prompt):
+    messages = [{'role': 'user', 'content': prompt}]
+    if system_prompt:
+        messages.insert(0, {'role': 'system', 'content': system_prompt})
+    return messages
+
+def _llm_fallback(models, temperature, system_prompt, prompt, fallback, error):
+    """Local answer when the model is unreachable: stale cache entry, caller fallback, or error text."""
+    stale = _lookup_cached(get_stale, models, temperature, system_prompt, prompt)
+    if stale is not None:
+        if DEBUG: st.write(f"DEBUG: LLM unavailable ({error}); serving stale cached answer")
+        return stale
+    if fallback is not None:
+        return fallback
+    return f'(LLM error: {error})'
+
+def call_llm_json(prompt, schema_name, schema, **kwargs):
+    """
+    call_llm for structured output: asks for `schema` as a strict JSON-schema response format
+    (where the backend supports it) and pulls the JSON value out of the reply.
+    Returns (value, raw_text); value is None when no JSON could be found. Callers validate the
+    value and report the outcome with mark_parsed(raw_text, ok); a failed reply is dropped from
+    the cache there, so only replies that validated keep answering later calls.
+    """
+    kwargs.setdefault("fallback", "")
+    kwargs["feature"] = kwargs.get("feature") or _caller_name()
+    text = call_llm(prompt, response_format=json_schema_format(schema_name, schema), **kwargs)
+    try:
+        return extract_json(text), text
+    except ValueError:
+        return None, text
+
+# ---------- Async Fan-out ----------
+async def _acall_llm(session, prompt, model=None, temperature=0.2, system_prompt=TUTOR_SYSTEM_PROMPT, use_cache=True, fallback=None, feature=None, response_format=None, task=None, trimmable=None, models=None):
+    """
+    Async twin of call_llm; shares the response cache, coalescing, resilience guards, telemetry and fallback convention.
+    `models` (from _cache_models) is passed instead of `model` when call_llm_many routed the batch.
+    """
+    models = models or _cache_models(model, task)
+    model = models[0]
+    started = time.perf_counter()
+    if use_cache:
+        hit_key, cached = _find_cached(get_cached, models, temperature, system_prompt, prompt)
+        if cached is not None:
+            return _keyed(tag(cached, record_call(feature, model, time.perf_counter() - started, cache_hit=True)), hit_key)
+    try:
+        sent_prompt, stored = _apply_budget(prompt, trimmable, models, temperature, system_prompt, feature)
+    except BudgetExceeded as e:
+        record_call(feature, model, time.perf_counter() - started, error=e)
+        return _llm_fallback(models, temperature, system_prompt, prompt, fallback, e)
+    if stored is not None:
+        return tag(stored, record_call(feature, model, time.perf_counter() - started, cache_hit=True))
+    prompt = sent_prompt
+    cache_key = make_key(model, temperature, system_prompt, prompt) if use_cache else None
+    messages = _build_messages(prompt, system_prompt)
+    extra = _backend_kwargs(get_backend(), response_format)
+
+    estimated = estimate_request_tokens(messages, model)
+
+    async def complete():
+        try:
+            async with get_scheduler().aslot():
+                completion = await guarded_acall(
+                    lambda: ahedged_call(lambda: session.acomplete(messages, model, temperature, **extra), feature, estimated),
+                    estimated,
+                )
+        except Exception as e:
+            record_call(feature, model, time.perf_counter() - started, error=e)
+            get_router().record(task, model, error=True)
+            raise
+        return _finish_completion(completion, model, feature, started, cache_key, task)
+
+    try:
+        if not cache_key:
+            return await complete()
+        return await get_single_flight().ado(_flight_key(models, temperature, system_prompt, prompt), complete)
     except Exception as e:
-        return f'(LLM error: {e})'
+        return _llm_fallback(models, temperature, system_prompt, prompt, fallback, e)
+
+async def _gather_llm(prompts, max_concurrency, timeout, priority, **kwargs):
+    """Run every prompt concurrently (at most `max_concurrency` in flight), keeping input order."""
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    # call_llm_many may run this on a helper thread, so the caller's priority is passed in explicitly
+    with llm_priority(priority):
+        async with get_backend().async_session() as session:
+            async def _one(prompt):
+                async with semaphore:
+                    try:
+                        return await asyncio.wait_for(_acall_llm(session, prompt, **kwargs), timeout)
+                    except asyncio.TimeoutError:
+                        record_call(kwargs.get("feature"), kwargs["models"][0], timeout, error="timeout")
+                        if kwargs.get("fallback") is not None:
+                            return kwargs["fallback"]
+                        return f'(LLM error: timed out after {timeout:.0f}s)'
+            return await asyncio.gather(*(_one(p) for p in prompts))
+
+def call_llm_many(prompts, max_concurrency=LLM_MAX_CONCURRENCY, timeout=LLM_TASK_TIMEOUT, **kwargs):
+    """
+    Sync entry point for concurrent LLM calls, usable from Streamlit pages.
+    Returns one response string per prompt, in the same order as `prompts`.
+    Accepts the same keyword arguments as call_llm (model, temperature, system_prompt, use_cache, fallback, feature, response_format, task).
+    The whole batch uses one model.
+    """
+    prompts = list(prompts)
+    if not prompts:
+        return []
+    kwargs["feature"] = kwargs.get("feature") or _caller_name()
+    kwargs["models"] = _cache_models(kwargs.pop("model", None), kwargs.get("task"))
+    _count_llm_calls(kwargs["feature"], len(prompts))
+    priority = current_priority()
+    coro_factory = lambda: _gather_llm(prompts, max_concurrency, timeout, priority, **kwargs)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro_factory())
+
+    # Already inside an event loop (e.g. a notebook): run the batch on a helper thread
+    result = {}
+    def _runner():
+        result["value"] = asyncio.run(coro_factory())
+    worker = threading.Thread(target=_runner, daemon=True)
+    worker.start()
+    worker.join()
+    return result["value"]
+
+# ---------- Streaming ----------
+def stream_llm(prompt, model=None, temperature=0.2, system_prompt=TUTOR_SYSTEM_PROMPT, use_cache=True, feature=None, task=None, trimmable=None, validate=None, response_format=None):
+    """
+    Streaming variant of call_llm: yields text chunks as the model produces them,
+    so the UI can show the first words right away (e.g. with st.write_stream).
+    Shares the response cache with call_llm; a cache hit is yielded as a single chunk
+    and a completed stream is written back to the cache, if `validate(text)` (when given) is true.
+    `response_format` is sent as in call_llm.
+    """
+    # Resolve the feature eagerly: once iteration starts the caller is whoever consumes the generator
+    feature = feature or _caller_name()
+    _count_llm_calls(feature)
+    # Generators run in their consumer's context, so capture the caller's priority now
+    return _stream_llm(prompt, _cache_models(model, task), temperature, system_prompt, use_cache, feature, task,
+                       current_priority(), trimmable, validate, response_format)
+
+def _stream_llm(prompt, models, temperature, system_prompt, use_cache, feature, task=None, priority=None, trimmable=None, validate=None, response_format=None):
+    model = models[0]
+    started = time.perf_counter()
+    if use_cache:
+        cached = _lookup_cached(get_cached, models, temperature, system_prompt, prompt)
+        if cached is not None:
+            elapsed = time.perf_counter() - started
+            record_call(feature, model, elapsed, cache_hit=True, ttft_s=elapsed)
+            yield cached
+            return
+
+    try:
+        sent_prompt, stored = _apply_budget(prompt, trimmable, models, temperature, system_prompt, feature)
+    except BudgetExceeded as e:
+        record_call(feature, model, time.perf_counter() - started, error=e)
+        yield _llm_fallback(models, temperature, system_prompt, prompt, None, e)
+        return
+    if stored is not None:
+        record_call(feature, model, time.perf_counter() - started, cache_hit=True)
+        yield stored
+        return
+    prompt = sent_prompt
+    cache_key = make_key(model, temperature, system_prompt, prompt) if use_cache else None
+
+    # The slot is held until the stream is exhausted or closed
+    with get_scheduler().slot(priority):
+        yield from _stream_from_model(prompt, models, temperature, system_prompt, feature, task, started, cache_key,
+                                      validate, response_format)
+
+def _stream_from_model(prompt, models, temperature, system_prompt, feature, task, started, cache_key, validate=None, response_format=None):
+    model = models[0]
+    backend = get_backend()
+    messages = _build_messages(prompt, system_prompt)
+    extra = _backend_kwargs(backend, response_format)
+
+    def _open_stream():
+        # Pull the first chunk inside the guard so connection errors and 429s get retried
+        chunks = iter(backend.stream(messages, model, temperature, **extra))
+        return chunks, next(chunks, "")
+
+    try:
+        chunks, first = guarded_call(_open_stream, estimate_request_tokens(messages, model))
+    except Exception as e:
+        record_call(feature, model, time.perf_counter() - started, error=e)
+        get_router().record(task, model, error=True)
+        yield _llm_fallback(models, temperature, system_prompt, prompt, None, e)
+        return
+    ttft = time.perf_counter() - started
+
+    parts = []
+    try:
+        for delta in itertools.chain([first], chunks):
+            if delta:
+                # Hold back leading whitespace so the stream matches call_llm's stripped text
+                if not parts:
+                    delta = delta.lstrip()
+                    if not delta:
+                        continue
+                parts.append(delta)
+                yield delta
+    except Exception as e:
+        record_call(feature, model, time.perf_counter() - started, error=e, ttft_s=ttft)
+        yield f'(LLM error: {e})'
+        return
+
+    text = "".join(parts).strip()
+    # Streams don't report usage, so log estimates
+    latency = time.perf_counter() - started
+    prompt_tokens = sum(estimate_tokens(m["content"], model) for m in messages)
+    completion_tokens = estimate_tokens(text, model) if text else 0
+    record_call(feature, model, latency, prompt_tokens, completion_tokens, ttft_s=ttft)
+    get_router().record(task, model, latency, prompt_tokens, completion_tokens)
+    llm_budget.record_usage(feature, prompt_tokens + completion_tokens)
+    if cache_key and parts and (validate is None or validate(text)):
+        put_cached(cache_key, model, text)
 
 # ---------- Reading Comprehension Functions ----------
+def _simplify_prompt(text):
+    return f"Rewrite this passage in clear, kid-friendly language for a 5th grader:\n\n{text}"
+
+def _explain_word_prompt(word, context):
+    return f"Explain the word '{word}' to a 5th grader using this context:\n\n{context}"
+
 def simplify_text(text):
     """Simplify a passage for a 5th grader."""
-    prompt = f"Rewrite this passage in clear, kid-friendly language for a 5th grader:\n\n{text}"
-    return call_llm(prompt)
+    return call_llm(_simplify_prompt(text), task="simplify", trimmable=text)
 
 def generate_questions(text, n=3):
     """Generate comprehension questions for the given passage."""
     prompt = f"Create {n} short comprehension questions (no answers) for a 5th grader based on this passage:\n\n{text}"
-    return call_llm(prompt)
+    return call_llm(prompt, task="questions", trimmable=text)
 
 def explain_word(word, context):
-    """Explain the meaning of a word in context."""
-    prompt = f"Explain the word '{word}' to a 5th grader using this context:\n\n{context}"
-    return call_llm(prompt)
+    """
+    Explain the meaning of a word in context.
+    Only the sentences around the word are sent (glossary.sentence_window), and explanations
+    are remembered in the glossary per (word, window).
+    """
+    window = glossary.sentence_window(word, context)
+    known = glossary.lookup(word, window)
+    if known is not None:
+        return known
+    explanation = call_llm(_explain_word_prompt(word, window), task="explain_word")
+    glossary.remember(word, window, explanation)
+    return explanation
+
+def explain_word_stream(word, context):
+    """Streaming version of explain_word; yields chunks of the explanation."""
+    window = glossary.sentence_window(word, context)
+    known = glossary.lookup(word, window)
+    if known is not None:
+        return iter([known])
+    return _remember_stream(word, window, stream_llm(_explain_word_prompt(word, window), task="explain_word"))
+
+def _remember_stream(word, window, chunks):
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    glossary.remember(word, window, "".join(parts).strip())
+
+def explain_words(words, context):
+    """
+    Batch version of explain_word: every word not already in the glossary is explained in one
+    structured call, each with its own sentence window. Returns {word: explanation} in input order.
+    """
+    words = list(dict.fromkeys(w.strip() for w in words if w and w.strip()))
+    windows = {w: glossary.sentence_window(w, context) for w in words}
+    explanations = {}
+    missing = []
+    for w in words:
+        known = glossary.lookup(w, windows[w])
+        if known is not None:
+            explanations[w] = known
+        else:
+            missing.append(w)
+
+    if missing:
+        items = "\n".join(f'- "{w}" in: {windows[w]}' for w in missing)
+        prompt = f"""
+    Explain each of these words to a 5th grader, using the sentences shown for context:
+
+    {items}
+
+    Return ONLY valid JSON: an object whose "explanations" key holds one
+    {{"word": "...", "explanation": "..."}} object per word, with a one or two sentence explanation.
+    """
+        value, raw = call_llm_json(prompt, "word_explanations", WORD_EXPLANATIONS_SCHEMA, task="explain_word")
+        returned = {k.casefold(): v for k, v in parse_word_explanations(
+            value.get("explanations") if isinstance(value, dict) else value
+        ).items()}
+        mark_parsed(raw, all(w.casefold() in returned for w in missing))
+        for w in missing:
+            if w.casefold() in returned:
+                explanations[w] = returned[w.casefold()]
+                glossary.remember(w, windows[w], explanations[w])
+            else:
+                # The model skipped it: ask for this one on its own
+                explanations[w] = explain_word(w, context)
+
+    return {w: explanations[w] for w in words}
+
+# ---------- Long Passages (map-reduce) ----------
+def split_for_simplify(text, chunk_chars=SIMPLIFY_CHUNK_CHARS):
+    """Paragraph-aware chunks of at most ~chunk_chars, in passage order."""
+    from utils.passage_loader import group_paragraphs
+    return group_paragraphs(text, chunk_chars, split_long=True)
+
+def simplify_chunks(chunks, max_workers=SIMPLIFY_WORKERS, on_progress=None, on_result=None):
+    """
+    Map step: simplify every chunk concurrently and return the results in chunk order.
+    on_progress(done, total) and on_result(index, simplified) are called from the calling thread
+    as each chunk finishes.
+    """
+    results = [None] * len(chunks)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="simplify") as pool:
+        # copy_context keeps the caller's llm_priority (e.g. prefetch) on the worker threads
+        futures = {pool.submit(contextvars.copy_context().run, simplify_text, chunk): i for i, chunk in enumerate(chunks)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            results[i] = future.result().strip()
+            if on_result:
+                on_result(i, results[i])
+            if on_progress:
+                on_progress(done, len(chunks))
+    return results
+
+def _simplify_units(units, max_workers=SIMPLIFY_WORKERS, on_progress=None, on_unit=None):
+    """
+    Simplify each unit (paragraph or chunk), reusing the stored result for any unit simplified
+    before; only new or edited units reach the model.
+    on_unit(position, simplified) reports each unit as soon as it is known, in no particular order.
+    Returns (simplified units in order, how many were reused).
+    """
+    known = paragraph_cache.lookup_many(units)
+    reused = sum(1 for u in units if paragraph_cache.unit_hash(u) in known)
+    changed = list(dict.fromkeys(u for u in units if paragraph_cache.unit_hash(u) not in known))
+    if on_unit:
+        for position, u in enumerate(units):
+            if paragraph_cache.unit_hash(u) in known:
+                on_unit(position, known[paragraph_cache.unit_hash(u)])
+
+    def _report(i, simplified):
+        if on_unit:
+            for position, u in enumerate(units):
+                if u == changed[i]:
+                    on_unit(position, simplified)
+
+    if changed:
+        fresh = simplify_chunks(changed, max_workers, on_progress, _report)
+        paragraph_cache.store_many(zip(changed, fresh))
+        known.update({paragraph_cache.unit_hash(u): simplified for u, simplified in zip(changed, fresh)})
+    return [known[paragraph_cache.unit_hash(u)] for u in units], reused
+
+def _passage_units(text):
+    """How a passage is split for simplification: chunks when it is long, otherwise its paragraphs."""
+    if len(text) > SIMPLIFY_CHUNK_CHARS:
+        return split_for_simplify(text, SIMPLIFY_CHUNK_CHARS)
+    return [p.strip() for p in text.split("\n\n") if p.strip()]
+
+def _question_source(parts, max_chars=QUESTION_SOURCE_CHARS):
+    """
+    Text to write a long passage's questions from: all simplified parts if they fit in max_chars,
+    else parts spread evenly across the passage (always the first) until the limit is reached.
+    """
+    joined = "\n\n".join(parts)
+    if len(joined) <= max_chars:
+        return joined
+    step = max(1, len(parts) * max(len(p) for p in parts) // max_chars)
+    picked, used = [], 0
+    for part in parts[::step]:
+        if picked and used + len(part) > max_chars:
+            break
+        picked.append(part)
+        used += len(part) + 2
+    return "\n\n".join(picked)[:max_chars]
+
+def _analyze_long_passage(chunks, n_questions, on_progress, on_paragraph=None):
+    # The original may not fit one request, so questions are written from the (shorter)
+    # simplified parts once they are ready, bounded by QUESTION_SOURCE_CHARS
+    simplified, reused = _simplify_units(chunks, on_progress=on_progress, on_unit=on_paragraph)
+    questions = generate_questions(_question_source(simplified), n_questions)
+    return PassageAnalysis("\n\n".join(simplified), _questions_from_text(questions), {},
+                           paragraphs=simplified, reused_parts=reused)
+
+def _reanalyze_edited_passage(text, units, previous, on_progress, on_paragraph=None):
+    """An edit of the previous passage: re-simplify changed paragraphs, keep questions and still-present words."""
+    simplified, reused = _simplify_units(units, on_progress=on_progress, on_unit=on_paragraph)
+    vocabulary = {
+        w: e for w, e in previous.vocabulary.items()
+        if re.search(r"\b" + re.escape(w), text, re.IGNORECASE)
+    }
+    return PassageAnalysis("\n\n".join(simplified), list(previous.questions), vocabulary,
+                           paragraphs=simplified, reused_parts=reused)
+
+def _questions_from_text(text):
+    """Split generate_questions' numbered list into plain question strings."""
+    lines = (re.sub(r"^\s*(?:\d+\s*[\).:-]|[-*•])\s*", "", ln).strip() for ln in text.splitlines())
+    return [ln for ln in lines if ln]
+
+def _is_edit_of(units, previous):
+    """True when `units` are mostly the paragraphs `previous` analysed, i.e. the passage was edited, not replaced."""
+    if previous is None or not units or not previous.source_units:
+        return False
+    overlap = len({paragraph_cache.unit_hash(u) for u in units} & set(previous.source_units))
+    return overlap * 2 >= len(set(previous.source_units)) and overlap * 2 >= len(units)
+
+def _analysis_mode(text, units, previous):
+    """How analyze_passage handles `text`: "edit" (reuse the previous run), "long" (chunks) or "single" (one call)."""
+    if _is_edit_of(units, previous):
+        known = paragraph_cache.lookup_many(units)
+        if sum(1 for u in units if paragraph_cache.unit_hash(u) in known) * 2 >= len(units):
+            return "edit"
+    if len(text) > SIMPLIFY_CHUNK_CHARS and len(units) > 1:
+        return "long"
+    return "single"
+
+def _passage_analysis_prompt(text, n_paragraphs, n_questions, n_words):
+    return f"""
+    Read this passage and help a 5th grader with it:
+
+    {text}
+
+    Return ONLY valid JSON with keys exactly:
+    "simplified_paragraphs": the passage rewritten in clear, kid-friendly language, as one string
+                             per paragraph of the original ({n_paragraphs} paragraph(s), separated by
+                             blank lines above), in the same order,
+    "questions": {n_questions} short comprehension questions (no answers),
+    "vocabulary": up to {n_words} words from the passage a 5th grader might find tricky,
+                  each as {{"word": "...", "explanation": "..."}} with a one or two sentence
+                  explanation that uses the passage for context.
+    """
+
+def analyze_passage(text, n_questions=3, n_words=5, on_progress=None, previous=None, on_paragraph=None):
+    """
+    One call that does what simplify_text + generate_questions + explain_word did separately:
+    returns a PassageAnalysis with the simplified passage, comprehension questions and
+    explanations for the words a 5th grader is likely to find tricky.
+    The passage is sent once instead of once per call. If the reply can't be used, falls back
+    to the separate simplify/questions calls (without vocabulary).
+    Passages longer than SIMPLIFY_CHUNK_CHARS are simplified in parallel chunks instead
+    (no vocabulary); on_progress(done, total) reports each finished chunk and
+    on_paragraph(index, simplified) each simplified part as soon as it is ready.
+    Pass the `previous` analysis when the passage was just edited: if most of its paragraphs
+    are still there, only the edited ones are simplified again and its questions/words are kept.
+    An unrelated `previous` is ignored.
+    """
+    units = _passage_units(text)
+    mode = _analysis_mode(text, units, previous)
+    if mode == "edit":
+        return _with_source(_reanalyze_edited_passage(text, units, previous, on_progress, on_paragraph), units)
+    if mode == "long":
+        return _with_source(_analyze_long_passage(units, n_questions, on_progress, on_paragraph), units)
+
+    prompt = _passage_analysis_prompt(text, len(units), n_questions, n_words)
+    value, raw = call_llm_json(prompt, "passage_analysis", PASSAGE_ANALYSIS_SCHEMA, task="passage_analysis",
+                                trimmable=text)
+    try:
+        analysis = PassageAnalysis.from_obj(value)
+    except ValueError:
+        mark_parsed(raw, False)
+        if DEBUG: st.write("DEBUG: Passage analysis unusable; falling back to separate calls")
+        fallback = PassageAnalysis(simplify_text(text), _questions_from_text(generate_questions(text, n_questions)), {})
+        return _with_source(fallback, units)
+    mark_parsed(raw, True)
+    _remember_paragraphs(units, analysis)
+    return _with_source(analysis, units)
+
+def _parses_as_analysis(text):
+    try:
+        PassageAnalysis.from_obj(extract_json(text))
+    except ValueError:
+        return False
+    return True
+
+def _with_source(analysis, units):
+    """Record which original units `analysis` covers, so a later edit can be recognised."""
+    analysis.source_units = [paragraph_cache.unit_hash(u) for u in units]
+    return analysis
+
+def _remember_paragraphs(units, analysis):
+    if len(analysis.paragraphs) == len(units):
+        # Remember each paragraph's rewrite so a later edit only re-sends what changed
+        paragraph_cache.store_many(zip(units, analysis.paragraphs))
+
+class PassageAnalysisStream:
+    """
+    analyze_passage for the page: iterate it (e.g. with st.write_stream) to get the simplified
+    passage paragraph by paragraph as each one is ready; `analysis` holds the PassageAnalysis
+    once iteration has finished.
+    One-call analyses stream the model's reply and show each paragraph as its JSON string closes;
+    long and edited passages show parts as the parallel chunks finish, in passage order, and
+    report on_progress(done, total) for each finished part (called from the iterating thread).
+    """
+
+    def __init__(self, text, n_questions=3, n_words=5, previous=None, on_progress=None):
+        self.text = text
+        self.n_questions = n_questions
+        self.n_words = n_words
+        self.previous = previous
+        self.on_progress = on_progress
+        self.analysis = None
+
+    def __iter__(self):
+        units = _passage_units(self.text)
+        if _analysis_mode(self.text, units, self.previous) == "single":
+            paragraphs = self._stream_single_call(units)
+        else:
+            paragraphs = self._stream_parts()
+        for i, paragraph in enumerate(paragraphs):
+            yield ("\n\n" if i else "") + paragraph
+
+    def _stream_single_call(self, units):
+        prompt = _passage_analysis_prompt(self.text, len(units), self.n_questions, self.n_words)
+        items = JSONArrayItemStream("simplified_paragraphs")
+        parts, shown = [], []
+        for chunk in stream_llm(prompt, task="passage_analysis", trimmable=self.text, feature="analyze_passage",
+                                validate=_parses_as_analysis,
+                                response_format=json_schema_format("passage_analysis", PASSAGE_ANALYSIS_SCHEMA)):
+            parts.append(chunk)
+            for paragraph in items.feed(chunk):
+                if paragraph.strip():
+                    shown.append(paragraph.strip())
+                    yield shown[-1]
+        try:
+            analysis = PassageAnalysis.from_obj(extract_json("".join(parts)))
+        except ValueError:
+            if DEBUG: st.write("DEBUG: Streamed passage analysis unusable; falling back to separate calls")
+            simplified = "\n\n".join(shown) if shown else simplify_text(self.text)
+            if not shown:
+                yield simplified
+            questions = _questions_from_text(generate_questions(self.text, self.n_questions))
+            self.analysis = _with_source(PassageAnalysis(simplified, questions, {}, paragraphs=list(shown)), units)
+            return
+        # Anything the array scan didn't surface (e.g. a reply with one "simplified_text" string)
+        yield from analysis.paragraphs[len(shown):]
+        _remember_paragraphs(units, analysis)
+        self.analysis = _with_source(analysis, units)
+
+    def _stream_parts(self):
+        # analyze_passage runs on a helper thread and reports parts and progress through a queue;
+        # they are handled here so on_progress runs on the iterating (Streamlit script) thread
+        ready, finished, progress = queue.Queue(), object(), object()
+
+        def _run():
+            try:
+                result = analyze_passage(self.text, self.n_questions, self.n_words, previous=self.previous,
+                                         on_progress=lambda done, total: ready.put((progress, (done, total))),
+                                         on_paragraph=lambda i, p: ready.put((i, p)))
+            except BaseException as e:
+                result = e
+            ready.put((finished, result))
+
+        threading.Thread(target=contextvars.copy_context().run, args=(_run,), daemon=True).start()
+        pending, next_index = {}, 0
+        while True:
+            index, value = ready.get()
+            if index is finished:
+                break
+            if index is progress:
+                if self.on_progress:
+                    self.on_progress(*value)
+                continue
+            pending[index] = value
+            while next_index in pending:
+                yield pending.pop(next_index)
+                next_index += 1
+        if isinstance(value, BaseException):
+            raise value
+        yield from value.paragraphs[next_index:]
+        self.analysis = value
 
 # ---------- Grammar Functions ----------
 def generate_sentences(n=5):
     """Generate a clean list of N simple sentences for grammar practice.
-    Tries to parse a JSON array from the model; falls back to line-splitting.
+    Asks for a {"sentences": [...]} JSON object; falls back to line-splitting.
     """
-    import json, re
 
     prompt = (
         "You are generating short practice sentences for a 5th grader. "
         f"Write exactly {n} simple, self-contained sentences (8–20 words each). "
         "Use everyday vocabulary. No dialogue, no quoted speech, no numbers or bullets. "
-        "Return ONLY valid JSON: an array of strings, like [\"The cat sat on the warm windowsill.\", ...]. "
+        "Return ONLY valid JSON: an object whose \"sentences\" key holds an array of strings, "
+        "like {\"sentences\": [\"The cat sat on the warm windowsill.\", ...]}. "
         "Do not include any preface or explanation."
     )
 
-    text = call_llm(prompt, temperature=0.1)
+    # Fresh sentences on every request, so skip the response cache
+    value, text = call_llm_json(prompt, "sentences", SENTENCES_SCHEMA, temperature=0.1, use_cache=False, task="sentences")
 
-    # Try to extract and parse a JSON array
     try:
-        match = re.search(r"\[.*\]", text, re.DOTALL)
-        if match:
-            text = match.group(0)
-        items = json.loads(text)
-        if not isinstance(items, list):
-            raise ValueError("Not a list")
-        candidates = [str(s).strip() for s in items]
-    except Exception:
+        candidates = [str(s).strip() for s in unwrap_list(value, "sentences")]
+        mark_parsed(text, True)
+    except ValueError:
+        mark_parsed(text, False)
         # Fallback: split lines and clean
         lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
         candidates = []
@@ -123,64 +864,79 @@ def generate_sentences(n=5):
     return sentences
 
 
-def generate_grammar_question(sentence: object, category: object = None, include_answer: object = False) -> dict[str, str | list[str]] | Any:
-    """
-    Generates a multiple-choice grammar question for the provided sentence,
-    guided by the provided category (e.g., vocabulary, punctuation, writing_quality).
-    Returns a dict: {"prompt": str, "options": [str, ...]} by default,
-    or includes "answer" if include_answer=True.
-    """
+CATEGORY_EXAMPLES = {
+    "vocabulary": "Ask about what a word means, its prefix/suffix, or how it changes meaning.",
+    "writing_quality": "Ask how to improve clarity, coherence, or sentence strength.",
+    "punctuation": "Ask where punctuation should be placed or which punctuation mark is correct.",
+    "sentence_structure": "Ask about subjects, verbs, clauses, or sentence order.",
+    "literary_devices": "Ask which phrase shows a metaphor, simile, idiom, or personification.",
+    "mechanics": "Ask about capitalization, spelling, or general grammar correctness.",
+    "general": "Ask a basic grammar comprehension question suitable for a 5th grader."
+}
+
+_PLACEHOLDER_RE = r"(?i)\s*(?:practice\s*question|question\s*(?:on|about)?)\s*[:\-\s]*([a-zA-Z_ ]+)\s*\.?$"
 
-    # Detect and sanitize placeholder-style inputs (e.g., "Practice question about nouns", "Question on prefix", etc.)
+def _clean_question_sentence(sentence):
+    """Unwrap dict inputs and turn placeholder-style text ("Question on prefix") into a real request."""
     if isinstance(sentence, dict):
         sentence = sentence.get("question", str(sentence))
 
     cleaned_sentence = sentence.strip()
 
     # Only treat as placeholder if it's short and not already a full question/prompt
-    if len(cleaned_sentence.split()) <= 8 and re.fullmatch(
-        r"(?i)\s*(?:practice\s*question|question\s*(?:on|about)?)\s*[:\-\s]*([a-zA-Z_ ]+)\s*\.?$",
-        cleaned_sentence,
-    ):
-        placeholder_match = re.fullmatch(
-            r"(?i)\s*(?:practice\s*question|question\s*(?:on|about)?)\s*[:\-\s]*([a-zA-Z_ ]+)\s*\.?$",
-            cleaned_sentence,
-        )
+    if len(cleaned_sentence.split()) <= 8:
+        placeholder_match = re.fullmatch(_PLACEHOLDER_RE, cleaned_sentence)
         if placeholder_match:
             topic_clean = placeholder_match.group(1).strip().replace("_", " ").title()
             sentence = f"Write a grammar practice question about {topic_clean} suitable for a 5th grader."
             if DEBUG:
                 st.write(f"DEBUG: Placeholder sanitized → topic='{topic_clean}' → replaced with: {sentence}")
-    else:
-        if DEBUG:
-            st.write(f"DEBUG: Skipped placeholder sanitization for valid sentence: {sentence}")
+            return sentence
+    if DEBUG:
+        st.write(f"DEBUG: Skipped placeholder sanitization for valid sentence: {sentence}")
+    return sentence
+
+def _category_instruction(category):
+    return CATEGORY_EXAMPLES.get((category or "general").lower(), CATEGORY_EXAMPLES["general"])
+
+def _validate_grammar_question(obj, include_answer):
+    """Check a parsed question dict; returns the cleaned dict or raises ValueError."""
+    return parse_grammar_question(obj, include_answer)
+
+def _fallback_grammar_question(sentence, include_answer):
+    fallback = {
+        "prompt": f"Which word is a noun in the sentence: '{sentence}'?",
+        "options": ["noun", "verb", "adjective", "adverb"],
+        "answer": "noun",
+    }
+    if not include_answer:
+        fallback.pop("answer", None)
+    return fallback
+
+def generate_grammar_question(sentence: object, category: object = None, include_answer: object = False) -> dict[str, str | list[str]] | Any:
+    """
+    Generates a multiple-choice grammar question for the provided sentence,
+    guided by the provided category (e.g., vocabulary, punctuation, writing_quality).
+    Returns a dict: {"prompt": str, "options": [str, ...]} by default,
+    or includes "answer" if include_answer=True.
+    """
+    sentence = _clean_question_sentence(sentence)
 
     # Safeguard: default category to "general" if None
     if not category:
         category = "general"
 
-    CATEGORY_EXAMPLES = {
-        "vocabulary": "Ask about what a word means, its prefix/suffix, or how it changes meaning.",
-        "writing_quality": "Ask how to improve clarity, coherence, or sentence strength.",
-        "punctuation": "Ask where punctuation should be placed or which punctuation mark is correct.",
-        "sentence_structure": "Ask about subjects, verbs, clauses, or sentence order.",
-        "literary_devices": "Ask which phrase shows a metaphor, simile, idiom, or personification.",
-        "mechanics": "Ask about capitalization, spelling, or general grammar correctness.",
-        "general": "Ask a basic grammar comprehension question suitable for a 5th grader."
-    }
-
-    category_instruction = CATEGORY_EXAMPLES.get(category.lower(), CATEGORY_EXAMPLES["general"])
-
     prompt = f"""
     You are a 5th-grade ELA tutor. Create ONE multiple-choice grammar question
     about this exact sentence:
     "{sentence}"
 
     The question should reflect the topic category: "{category}".
-    {category_instruction}
+    {_category_instruction(category)}
 
     Write a thoughtful, age-appropriate question that tests understanding of this concept.
     Return ONLY valid JSON with keys exactly: "prompt", "options", and "answer".
+    "answer" must be copied exactly from "options".
     Example JSON:
     {{
       "prompt": "[Question here]",
@@ -190,47 +946,114 @@ def generate_grammar_question(sentence: object, category: object = None, include
     No preface, no markdown, no explanations, no reasoning.
     """
 
+    value, text = call_llm_json(
+        prompt, "grammar_question", GRAMMAR_QUESTION_SCHEMA,
+        task="grammar_mcq", temperature=0.4, system_prompt=None,
+    )
     try:
-        # category = detect_category_for_topic(topic, subject="grammar")
-        # if DEBUG: st.write(f"DEBUG: Sending prompt to LLM with category '{category}' and topic {topic}...")
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.4,
+        question = _validate_grammar_question(value, include_answer)
+    except ValueError:
+        mark_parsed(text, False)
+        return _fallback_grammar_question(sentence, include_answer)
+    mark_parsed(text, True)
+    return question
+
+def _request_grammar_question_batch(batch, use_cache=True):
+    """
+    One LLM round-trip for several (id, sentence, category) items.
+    Returns ({id: raw_object} for every object the model sent back with a usable id, raw reply);
+    the caller reports the reply with mark_parsed once the objects have been validated.
+    """
+    lines = []
+    for item_id, sentence, category in batch:
+        lines.append(
+            f'{item_id}. Sentence: "{sentence}"\n'
+            f'   Category: "{category}" — {_category_instruction(category)}'
         )
+    items_block = "\n".join(lines)
 
-        text = response.choices[0].message.content.strip()
-        match = re.search(r"\{.*\}", text, re.DOTALL)
-        if match:
-            text = match.group(0)
-        obj = json.loads(text)
-
-        # Minimal validation
-        if not all(k in obj for k in ("prompt", "options", "answer")):
-            raise ValueError("Missing keys")
-        if not isinstance(obj.get("options"), list) or not obj.get("options"):
-            raise ValueError("Options malformed")
-
-        # Sanitize: remove answer leaks from prompt
-        answer = obj.get("answer")
-        def scrub_leaks(txt):
-            return re.sub(r"(is correct|the answer is|correct answer)", "", txt, flags=re.I).strip()
-        obj["prompt"] = scrub_leaks(obj.get("prompt", ""))
+    prompt = f"""
+    You are a 5th-grade ELA tutor. For EACH numbered item below, create ONE multiple-choice
+    grammar question about that exact sentence, reflecting the item's category.
 
-        if not include_answer:
-            obj.pop("answer", None)
+    {items_block}
 
-        return obj
+    Write thoughtful, age-appropriate questions that test understanding of each concept.
+    Return ONLY a valid JSON object whose "questions" key holds an array with exactly {len(batch)} objects,
+    one per item, each with keys exactly: "id", "prompt", "options", and "answer". "id" is the item number
+    and "answer" must be copied exactly from "options".
+    Example JSON:
+    {{"questions": [
+      {{"id": 1, "prompt": "[Question here]", "options": ["Option A", "Option B", "Option C", "Option D"], "answer": "Option A"}}
+    ]}}
+    No preface, no markdown, no explanations, no reasoning.
+    """
 
-    except Exception as e:
-        fallback = {
-            "prompt": f"Which word is a noun in the sentence: '{sentence}'?",
-            "options": ["noun", "verb", "adjective", "adverb"],
-            "answer": "noun",
-        }
-        if not include_answer:
-            fallback.pop("answer", None)
-        return fallback
+    value, text = call_llm_json(
+        prompt, "grammar_questions", GRAMMAR_QUESTION_BATCH_SCHEMA,
+        task="grammar_mcq", temperature=0.4, system_prompt=None, use_cache=use_cache,
+    )
+    try:
+        items = unwrap_list(value, "questions")
+    except ValueError:
+        return {}, text
+
+    results = {}
+    expected_ids = [item_id for item_id, _, _ in batch]
+    for position, obj in enumerate(items):
+        if not isinstance(obj, dict):
+            continue
+        try:
+            item_id = int(obj.get("id"))
+        except (TypeError, ValueError):
+            # No usable id: trust the position if the model kept the order
+            item_id = expected_ids[position] if position < len(expected_ids) else None
+        if item_id in expected_ids and item_id not in results:
+            results[item_id] = obj
+    return results, text
+
+def generate_grammar_questions(sentences, categories=None, include_answer=False, max_retries=1):
+    """
+    Batched version of generate_grammar_question: every sentence (with its category)
+    goes out in a single request and comes back as a JSON array of question objects.
+    Items that are missing or fail validation are re-requested together, up to `max_retries`
+    times and bypassing the cache; anything still invalid gets the same fallback question as
+    the single-item version.
+    Returns one question dict per sentence, in order.
+    """
+    sentences = list(sentences)
+    if categories is None:
+        categories = [None] * len(sentences)
+    elif isinstance(categories, str):
+        categories = [categories] * len(sentences)
+
+    cleaned = [_clean_question_sentence(s) for s in sentences]
+    pending = [(i + 1, cleaned[i], categories[i] or "general") for i in range(len(cleaned))]
+    questions = {}
+
+    for attempt in range(max_retries + 1):
+        if not pending:
+            break
+        # A retry re-sends the same prompt, so it must skip the cache to get a new answer
+        raw, text = _request_grammar_question_batch(pending, use_cache=attempt == 0)
+        still_pending = []
+        for item in pending:
+            item_id = item[0]
+            try:
+                obj = raw[item_id]
+                obj.pop("id", None)
+                questions[item_id] = _validate_grammar_question(obj, include_answer)
+            except (KeyError, ValueError):
+                still_pending.append(item)
+        mark_parsed(text, not still_pending)
+        if DEBUG and still_pending:
+            st.write(f"DEBUG: Batch attempt {attempt + 1}: {len(still_pending)} question(s) failed validation")
+        pending = still_pending
+
+    return [
+        questions.get(i + 1) or _fallback_grammar_question(cleaned[i], include_answer)
+        for i in range(len(cleaned))
+    ]
 
 # ---------- Grammar Hint Helper ----------
 def get_grammar_hint(topic: str) -> str:
@@ -302,10 +1125,86 @@ def get_available_categories(conn=None):
     rows = cur.fetchall()
     return [r[0] for r in rows] if rows else []
 
-def generate_sentences_from_topics(conn=None, n=3, category=None):
+# ---------- Per-topic Question Stage ----------
+def _fetch_topic_prompt(cursor, t):
+    """Look up the stored prompt template and example for a topic. Returns (template, example)."""
+    try:
+        cursor.execute("""
+                       SELECT prompt_template, example
+                       FROM prompts
+                       WHERE LOWER(category) = LOWER(?)
+                         AND LOWER(topic) = LOWER(?)
+                       LIMIT 1;
+                       """, (t['category'], t['topic']))
+        row = cursor.fetchone()
+        if row:
+            if DEBUG:
+                st.write(f"DEBUG: Found DB prompt template for {t['topic']} ({t['category']})")
+            return row[0], row[1]
+    except Exception as e:
+        if DEBUG:
+            st.write(f"DEBUG: Failed to fetch prompt template for {t['topic']}: {e}")
+    return None, None
+
+def _render_topic_prompt(t, prompt_template=None, example=None):
+    """Build the final single-question prompt from a template (or the default) plus the JSON contract."""
+    if prompt_template:
+        prompt = prompt_template.format(
+            topic=t['topic'],
+            category=t['category'],
+            question_focus=t['question_focus']
+        )
+    else:
+        prompt = f"""
+    You are a 5th-grade English tutor. Generate ONE multiple-choice grammar question for the topic "{t['topic']}".
+    This question should directly test the concept named in the topic.
+    Category: {t['category']}
+    Question Focus: {t['question_focus']}
+
+    Rules:
+    - The question must be self-contained and natural for a 5th grader.
+    - Include 4 answer choices.
+    - Clearly indicate the correct answer.
+
+    Return ONLY valid JSON in this format:
+    {{
+      "topic": "{t['topic']}",
+      "question": "[Your question here]",
+      "options": ["A", "B", "C", "D"],
+      "answer": "Correct Option"
+    }}
+    """
+    # Append example if available
+    if example:
+        prompt += f"\nPlease see this example for guidance: {example}"
+
+    # Enforce strict JSON output
+    prompt += (
+        "\n\nIMPORTANT: Return ONLY valid JSON in this exact structure, no explanations or extra text:\n"
+        "{\n"
+        f'  "topic": "{t["topic"]}",\n'
+        '  "question": "[Your question here]",\n'
+        '  "options": ["Option A", "Option B", "Option C", "Option D"],\n'
+        '  "answer": "Correct Option"\n'
+        "}\n"
+        '"answer" must be copied exactly from "options".'
+    )
+    return prompt
+
+def _parse_topic_question(text, t):
+    """Turn one raw completion into a question dict, or None if it isn't a usable question."""
+    try:
+        return TopicQuestion.from_obj(extract_json(text, "{"), t["topic"], t["category"]).to_dict()
+    except ValueError as e:
+        if DEBUG:
+            st.write(f"DEBUG: Unusable question for topic '{t['topic']}' ({e}) — raw text:\n{text[:300]}")
+        return None
+
+def generate_sentences_from_topics(conn=None, n=3, category=None, topics=None):
     """
     Pulls active topics from DB, detects their categories using the concept map loader,
     and asks OpenAI for sentences for each, possibly customizing prompts per category.
+    Pass `topics` to generate for exactly those topics (repeats allowed) instead of a random sample.
     """
     # --- Integration point: load concept map for category detection ---
     from utils.db import get_connection
@@ -336,25 +1235,27 @@ def generate_sentences_from_topics(conn=None, n=3, category=None):
     concept_map = load_concept_map()
     # if DEBUG: st.write(f"DEBUG: Loaded concept map: {concept_map}")
 
-    # Randomly select up to n topics
-    selected_topics = random.sample(active_topics, min(n, len(active_topics)))
+    # Randomly select up to n topics, unless the caller already chose them
+    if topics is not None:
+        selected_topics = list(topics)
+    else:
+        selected_topics = random.sample(active_topics, min(n, len(active_topics)))
     if DEBUG: st.write(f"DEBUG: Selected topics: {selected_topics}")
     sentences = []
 
-    from utils.concept_map_db import get_concept
+    from utils.concept_map_db import get_concepts
+    # One lookup for every selected topic; a miss here is a miss for the
+    # concept-map loader too (in DB mode it asks the same resolver), so there is no fallback
+    concepts = get_concepts(selected_topics, subject="grammar")
     topics_data = []
     for topic in selected_topics:
-        if DEBUG: st.write(f"DEBUG from llm_helpers (b4 category/question_focus lookup): Topic: {topic}")
-        # Try to get from DB first
-        concept_record = get_concept(topic, subject="grammar")
-        if concept_record:
-            category = concept_record.get("category") if isinstance(concept_record, dict) else getattr(concept_record, "category", None)
-            question_focus = concept_record.get("question_focus") if isinstance(concept_record, dict) else getattr(concept_record, "question_focus", None)
-            if DEBUG: st.write(f"DEBUG Topic: {topic} - used DB record for category/question_focus. Category: {category}, Question Focus: {question_focus}")
-        else:
-            category = detect_category_for_topic(topic, subject="grammar")
-            question_focus = get_question_focus(topic, subject="grammar")
-            if DEBUG: st.write(f"DEBUG Topic: {topic} - used fallback detect_category/get_question_focus. Category: {category}, Question Focus: {question_focus}")
+        concept_record = concepts[topic]
+        if not concept_record:
+            if DEBUG: st.write(f"DEBUG Topic: {topic} - no concept found, skipping")
+            continue
+        category = concept_record["category"]
+        question_focus = concept_record["question_focus"]
+        if DEBUG: st.write(f"DEBUG Topic: {topic} - used DB record for category/question_focus. Category: {category}, Question Focus: {question_focus}")
         if question_focus:
             # Instead of calling the LLM here, collect info for batching
             topics_data.append({
@@ -363,147 +1264,31 @@ def generate_sentences_from_topics(conn=None, n=3, category=None):
                 "question_focus": question_focus,
             })
             # --- Debug: cache category in session state for visibility
-            st.session_state["last_category"] = category
+            try:
+                st.session_state["last_category"] = category
+            except Exception:
+                pass  # no script context, e.g. the question bank refill thread
             if DEBUG: st.write(f"DEBUG: Cached last_category in session: {category}")
         # For now, skip the other branches (vocabulary/category-only) for batching
         # To keep the batching logic simple, only batch those with question_focus
         # Optionally, you could batch all, but per instructions, just batch the question_focus ones
 
-    # --- Remove batching/groupby logic; do one LLM call per topic ---
-# --- Per-topic LLM call with guardrails and sanitization ---
+    # --- Single pass per topic: look up template → render → one LLM call → parse ---
     if topics_data:
-        for t in topics_data:
-            if DEBUG: st.write(f"DEBUG: Generating single-question call for topic '{t['topic']}' in category '{t['category']}'")
-            example = None  # ensure example is always initialized
-            prompt = ""  # ensure prompt is defined before use
-
-            if example:
-                prompt += f"\nPlease see this example for guidance: {example}"
-
-            # Enforce strict JSON output
-            prompt += (
-                "\n\nIMPORTANT: Return ONLY valid JSON in this exact structure, no explanations or extra text:\n"
-                "{\n"
-                f'  "topic": "{t["topic"]}",\n'
-                '  "question": "[Your question here]",\n'
-                '  "options": ["Option A", "Option B", "Option C", "Option D"],\n'
-                '  "answer": "Correct Option"\n'
-                "}"
-            )
-
-            text = call_llm(prompt)
-            prompt_template = None
-            try:
-                cursor.execute("""
-                               SELECT prompt_template, example
-                               FROM prompts
-                               WHERE LOWER(category) = LOWER(?)
-                                 AND LOWER(topic) = LOWER(?)
-                               LIMIT 1;
-                               """, (t['category'], t['topic']))
-                row = cursor.fetchone()
-                if row:
-                    prompt_template, db_example = row
-                    if db_example:
-                        example = db_example
-                    if DEBUG:
-                        st.write(f"DEBUG: Found DB prompt template for {t['topic']} ({t['category']})")
-            except Exception as e:
-                if DEBUG:
-                    st.write(f"DEBUG: Failed to fetch prompt template for {t['topic']}: {e}")
-
-            # Build prompt from template or fallback
-            if prompt_template:
-                prompt = prompt_template.format(
-                    topic=t['topic'],
-                    category=t['category'],
-                    question_focus=t['question_focus']
-                )
-            else:
-                prompt = f"""
-            You are a 5th-grade English tutor. Generate ONE multiple-choice grammar question for the topic "{t['topic']}".
-            This question should directly test the concept named in the topic.
-            Category: {t['category']}
-            Question Focus: {t['question_focus']}
-
-            Rules:
-            - The question must be self-contained and natural for a 5th grader.
-            - Include 4 answer choices.
-            - Clearly indicate the correct answer.
-
-            Return ONLY valid JSON in this format:
-            {{
-              "topic": "{t['topic']}",
-              "question": "[Your question here]",
-              "options": ["A", "B", "C", "D"],
-              "answer": "Correct Option"
-            }}
-            """
-            # Append example if available
-            if example:
-                prompt += f"\nPlease see this example for guidance: {example}"
-
-            # Enforce strict JSON output
-            prompt += (
-                "\n\nIMPORTANT: Return ONLY valid JSON in this exact structure, no explanations or extra text:\n"
-                "{\n"
-                f'  "topic": "{t["topic"]}",\n'
-                '  "question": "[Your question here]",\n'
-                '  "options": ["Option A", "Option B", "Option C", "Option D"],\n'
-                '  "answer": "Correct Option"\n'
-                "}"
-            )
+        prompts = [_render_topic_prompt(t, *_fetch_topic_prompt(cursor, t)) for t in topics_data]
 
-            text = call_llm(prompt)
-            # ---- GUARDRAIL: enforce strict JSON output and clean up any meta prefixes ----
-            import json, re
-            text = text.strip()
-            text = re.sub(r"(?i)(^sure|^okay|^here|^let.?s|^of course).*", "", text)
-            text = re.sub(r"(?i)(question on|topic:|category:)\s*[A-Za-z_ ]+[:\-]*", "", text)
-            text = re.sub(r"(?i)please see.*guidance.*", "", text)
-
-            # Attempt to extract JSON
-            match = re.search(r"\{.*\}", text, re.DOTALL)
-            if match:
-                text = match.group(0)
-
-            # Safety: don't attempt to parse if empty or truncated
-            if not text or len(text.strip()) < 5:
-                if DEBUG:
-                    st.write(f"DEBUG: Empty or invalid JSON text for topic '{t['topic']}'. Text was: {repr(text[:100])}")
-                continue
+        # Each click should give new practice questions, so bypass the response cache.
+        # All topics go out concurrently instead of one round-trip at a time.
+        texts = call_llm_many(
+            prompts, use_cache=False, fallback="", task="grammar_mcq",
+            response_format=json_schema_format("topic_question", TOPIC_QUESTION_SCHEMA),
+        )
 
-            try:
-                item = json.loads(text)
-            except json.JSONDecodeError:
-                if DEBUG:
-                    st.write(f"DEBUG: JSON parse failed once, retrying sanitize pass for topic '{t['topic']}'")
-                text = re.sub(r"```(?:json)?|```", "", text)
-                text = re.sub(r"(?i)example json.*?\{", "{", text)
-                text = text.strip()
-
-                # Skip if text still empty or too short
-                if not text or len(text.strip()) < 5:
-                    if DEBUG:
-                        st.write(f"DEBUG: JSON text still invalid/empty after sanitize for topic '{t['topic']}' → skipping")
-                    continue
-
-                try:
-                    item = json.loads(text)
-                except json.JSONDecodeError as e:
-                    if DEBUG:
-                        st.write(f"DEBUG: JSON parsing failed again for topic '{t['topic']}' — raw text:\n{text}\nError: {e}")
-                    continue  # Skip instead of crashing
-
-            # Validate structure strictly
-            if not isinstance(item, dict) or not all(k in item for k in ("question", "options", "answer")):
-                if DEBUG: st.write(f"DEBUG: Invalid or incomplete JSON for topic '{t['topic']}' → skipping")
+        for t, text in zip(topics_data, texts):
+            item = _parse_topic_question(text, t)
+            mark_parsed(text, item is not None)
+            if item is None:
                 continue
-
-            # Clean any leftover phrasing from the question
-            item["question"] = re.sub(
-                r"(?i)(question on|topic:|category:)\s*[A-Za-z_ ]+[:\-]*", "", item["question"]
-            ).strip()
             sentences.append(item)
             if DEBUG: st.write(f"DEBUG: Added question for topic '{t['topic']}'")
 
@@ -550,6 +1335,93 @@ def generate_sentences_from_topics(conn=None, n=3, category=None):
 
     return sentences
 
+def _render_topic_set_prompt(t, count, prompt_template=None, example=None):
+    """Like _render_topic_prompt, but asks for `count` different questions on the topic in one reply."""
+    if prompt_template:
+        prompt = prompt_template.format(
+            topic=t['topic'],
+            category=t['category'],
+            question_focus=t['question_focus']
+        )
+    else:
+        prompt = f"""
+    You are a 5th-grade English tutor. Generate multiple-choice grammar questions for the topic "{t['topic']}".
+    Each question should directly test the concept named in the topic.
+    Category: {t['category']}
+    Question Focus: {t['question_focus']}
+
+    Rules:
+    - Each question must be self-contained and natural for a 5th grader.
+    - Include 4 answer choices.
+    - Clearly indicate the correct answer.
+    """
+    if example:
+        prompt += f"\nPlease see this example for guidance: {example}"
+
+    prompt += (
+        f"\n\nIMPORTANT: Write {count} DIFFERENT questions: each uses its own sentence and tests the concept in its own way.\n"
+        "Return ONLY valid JSON in this exact structure, no explanations or extra text:\n"
+        '{"questions": [\n'
+        "  {\n"
+        f'    "topic": "{t["topic"]}",\n'
+        '    "question": "[Your question here]",\n'
+        '    "options": ["Option A", "Option B", "Option C", "Option D"],\n'
+        '    "answer": "Correct Option"\n'
+        "  }\n"
+        "]}\n"
+        'Each "answer" must be copied exactly from its "options".'
+    )
+    return prompt
+
+def generate_topic_question_sets(counts, conn=None):
+    """
+    Several distinct questions per topic with one call per topic (for the question bank).
+    `counts` maps topic -> how many questions to ask for. Returns validated question dicts
+    (as from generate_sentences_from_topics); a topic may come back with fewer than asked.
+    """
+    from utils.db import get_connection
+    from utils.concept_map_db import get_concepts
+    if conn is None or not hasattr(conn, "cursor"):
+        conn = get_connection()
+    cursor = conn.cursor()
+
+    concepts = get_concepts(list(counts), subject="grammar")
+    topics_data = [
+        {"topic": topic, "category": concepts[topic]["category"], "question_focus": concepts[topic]["question_focus"]}
+        for topic in counts
+        if concepts[topic] and concepts[topic]["question_focus"]
+    ]
+    if not topics_data:
+        return []
+
+    prompts = [_render_topic_set_prompt(t, counts[t["topic"]], *_fetch_topic_prompt(cursor, t)) for t in topics_data]
+    # Every refill should add new questions, so bypass the response cache
+    texts = call_llm_many(
+        prompts, use_cache=False, fallback="", task="grammar_mcq",
+        response_format=json_schema_format("topic_question_set", TOPIC_QUESTION_SET_SCHEMA),
+    )
+
+    questions = []
+    for t, text in zip(topics_data, texts):
+        try:
+            objs = unwrap_list(extract_json(text), "questions")
+        except ValueError:
+            objs = []
+        seen = set()
+        for obj in objs:
+            try:
+                item = TopicQuestion.from_obj(obj, t["topic"], t["category"]).to_dict()
+            except ValueError:
+                continue
+            # File it under the topic it was asked for, whatever the model echoed back
+            item.update(topic=t["topic"], category=t["category"])
+            if item["question"] not in seen:
+                seen.add(item["question"])
+                questions.append(item)
+        mark_parsed(text, bool(seen))
+        if DEBUG: st.write(f"DEBUG: {len(seen)} of {counts[t['topic']]} question(s) for topic '{t['topic']}'")
+    return questions
+
 # ---------- PDF Export Function ----------
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet
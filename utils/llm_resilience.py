@@ -0,0 +1,261 @@
+# ==============================
+# 🛡️ Homework Helper - LLM Rate Limiting & Resilience
+# ==============================
+# Shared, process-wide guards around every model request:
+#   - RateLimiter: requests/min and tokens/min token buckets (client side)
+#   - retries with exponential, fully jittered backoff on 429 / 5xx / connection errors
+#   - CircuitBreaker: after repeated failures, fail fast so callers use their local fallback
+import asyncio
+import os
+import random
+import threading
+import time
+
+LLM_RPM = float(os.getenv("LLM_RPM", "500"))  # requests per minute
+LLM_TPM = float(os.getenv("LLM_TPM", "200000"))  # tokens per minute
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "300"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))  # seconds
+LLM_BACKOFF_CAP = float(os.getenv("LLM_BACKOFF_CAP", "20"))  # seconds
+LLM_MAX_QUEUE_WAIT = float(os.getenv("LLM_MAX_QUEUE_WAIT", "30"))  # longest we'll wait for rate-limit capacity
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))  # consecutive failures before opening
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))  # seconds before a trial request
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+_RETRYABLE_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError"}
+
+
+class LLMUnavailable(Exception):
+    """Raised instead of calling the model when the circuit is open or capacity is exhausted."""
+
+
+# ---------- Rate Limiting ----------
+class TokenBucket:
+    """
+    Reservation-based token bucket refilled continuously at `rate_per_min`.
+    reserve() never blocks; it returns how long the caller must wait before sending,
+    so the same bucket serves threads (time.sleep) and coroutines (asyncio.sleep).
+    """
+
+    def __init__(self, rate_per_min, capacity=None):
+        self.rate = rate_per_min / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_min
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.level -= amount
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def refund(self, amount):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """Requests/min and tokens/min buckets shared by every LLM call in the process."""
+
+    def __init__(self, rpm=LLM_RPM, tpm=LLM_TPM, max_wait=LLM_MAX_QUEUE_WAIT):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_wait = max_wait
+
+    def _reserve(self, tokens):
+        wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        if wait > self.max_wait:
+            self.requests.refund(1)
+            self.tokens.refund(tokens)
+            raise LLMUnavailable(f"rate limit: next slot in {wait:.0f}s")
+        return wait
+
+    def acquire(self, tokens):
+        wait = self._reserve(tokens)
+        if wait:
+            time.sleep(wait)
+
+    def try_acquire(self, tokens):
+        """Take capacity only if it is available right now (used for optional extra requests)."""
+        wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        if wait:
+            self.requests.refund(1)
+            self.tokens.refund(tokens)
+            return False
+        return True
+
+    async def acquire_async(self, tokens):
+        wait = self._reserve(tokens)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def settle(self, estimated, actual):
+        """Correct the token bucket once the real usage is known."""
+        if actual is None:
+            return
+        if actual > estimated:
+            self.tokens.reserve(actual - estimated)
+        elif actual < estimated:
+            self.tokens.refund(estimated - actual)
+
+
+# ---------- Circuit Breaker ----------
+class CircuitBreaker:
+    """closed → (threshold consecutive failures) → open → (reset timeout) → half-open → closed/open."""
+
+    def __init__(self, threshold=LLM_BREAKER_THRESHOLD, reset_timeout=LLM_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self.trial_in_flight = False
+            if self.state == "half_open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.state = "closed"
+            self.trial_in_flight = False
+
+    def release_trial(self):
+        """The call was cancelled before it said anything about the service; let the next one try."""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+
+# ---------- Retry Policy ----------
+def is_retryable(exc):
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return type(exc).__name__ in _RETRYABLE_ERROR_NAMES or isinstance(exc, (TimeoutError, ConnectionError))
+
+
+def backoff_delay(attempt, exc=None):
+    """Full-jitter exponential backoff; honours a Retry-After header when the server sends one."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+    try:
+        if retry_after is not None:
+            return min(LLM_BACKOFF_CAP, float(retry_after))
+    except (TypeError, ValueError):
+        pass
+    return random.uniform(0, min(LLM_BACKOFF_CAP, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+_limiter = RateLimiter()
+_breaker = CircuitBreaker()
+
+
+def get_rate_limiter():
+    return _limiter
+
+
+def get_circuit_breaker():
+    return _breaker
+
+
+def estimate_request_tokens(messages, model=None):
+    """Prompt size plus an allowance for the reply, for the tokens/min bucket and the daily budget."""
+    from utils.llm_backends import estimate_tokens
+    return sum(estimate_tokens(m["content"], model) for m in messages) + LLM_EXPECTED_COMPLETION_TOKENS
+
+
+def guarded_call(fn, estimated_tokens, max_retries=LLM_MAX_RETRIES):
+    """
+    Run fn() (one model request) under the shared rate limiter, retry policy and circuit breaker.
+    Raises LLMUnavailable when the breaker is open, or the last error once retries are spent.
+    """
+    for attempt in range(max_retries + 1):
+        if not _breaker.allow():
+            raise LLMUnavailable("circuit open: too many recent LLM failures")
+        try:
+            _limiter.acquire(estimated_tokens)
+            result = fn()
+        except LLMUnavailable:
+            # Turned away locally (rate limiter) before anything was sent: no verdict on the service
+            _breaker.release_trial()
+            raise
+        except Exception as e:
+            if not is_retryable(e):
+                # Request problems (bad input, auth) say nothing about the service's health
+                _breaker.record_success()
+                raise
+            _breaker.record_failure()
+            if attempt == max_retries:
+                raise
+            time.sleep(backoff_delay(attempt, e))
+            continue
+        except BaseException:
+            # KeyboardInterrupt, a cancelled hedge: no verdict, but don't keep the half-open trial slot
+            _breaker.release_trial()
+            raise
+        _breaker.record_success()
+        _limiter.settle(estimated_tokens, _usage_total(result))
+        return result
+
+
+async def guarded_acall(coro_fn, estimated_tokens, max_retries=LLM_MAX_RETRIES):
+    """Async twin of guarded_call; coro_fn() must return a fresh awaitable per attempt."""
+    for attempt in range(max_retries + 1):
+        if not _breaker.allow():
+            raise LLMUnavailable("circuit open: too many recent LLM failures")
+        try:
+            await _limiter.acquire_async(estimated_tokens)
+            result = await coro_fn()
+        except LLMUnavailable:
+            _breaker.release_trial()
+            raise
+        except Exception as e:
+            if not is_retryable(e):
+                _breaker.record_success()
+                raise
+            _breaker.record_failure()
+            if attempt == max_retries:
+                raise
+            await asyncio.sleep(backoff_delay(attempt, e))
+            continue
+        except BaseException:
+            # CancelledError, e.g. call_llm_many's per-task timeout: release the trial slot
+            _breaker.release_trial()
+            raise
+        _breaker.record_success()
+        _limiter.settle(estimated_tokens, _usage_total(result))
+        return result
+
+
+def _usage_total(result):
+    prompt_tokens = getattr(result, "prompt_tokens", None)
+    completion_tokens = getattr(result, "completion_tokens", None)
+    if prompt_tokens is None or completion_tokens is None:
+        return None
+    return prompt_tokens + completion_tokens
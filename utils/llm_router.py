@@ -0,0 +1,179 @@
+# ==============================
+# 🧭 Homework Helper - Model Router
+# ==============================
+# Picks the model for each task type (simplify, questions, explain_word, grammar_mcq, ...)
+# from the candidates configured in data/model_routes.yaml, using rolling latency, token-cost
+# and parse-success stats the router records from its own calls.
+#
+# Overrides: pin a task to one model with LLM_MODEL_<TASK>=<model> (e.g. LLM_MODEL_SIMPLIFY=gpt-4o)
+# or `pin:` in the YAML file.
+import os
+import random
+import threading
+from collections import deque
+
+import yaml
+
+from utils.llm_telemetry import percentile
+
+DEFAULT_MODEL = os.getenv("LLM_DEFAULT_MODEL", "gpt-4o-mini")
+ROUTES_PATH = os.getenv("LLM_ROUTES_PATH", os.path.join("data", "model_routes.yaml"))
+
+# USD per 1M tokens (input, output); extend or override under `prices:` in the routes file
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+}
+
+_DEFAULT_SETTINGS = {
+    "window": 100,  # recent calls per (task, model)
+    "min_samples": 10,  # before a candidate's stats are trusted
+    "explore_rate": 0.05,  # share of calls sent to a candidate that is still short of samples
+    "parse_floor": 0.9,  # candidates parsing less often than this are avoided
+    "latency_weight": 0.5,
+    "cost_weight": 0.5,
+}
+
+
+def load_routes(path=ROUTES_PATH):
+    """Routes file contents ({} when missing): settings, prices, and tasks -> {candidates, pin}."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+class _CandidateStats:
+    def __init__(self, window):
+        self.latencies = deque(maxlen=window)
+        self.costs = deque(maxlen=window)
+        self.parsed = deque(maxlen=window)
+        self.errors = deque(maxlen=window)
+
+    def summary(self):
+        calls = len(self.errors)
+        return {
+            "calls": calls,
+            "p50_latency_s": percentile(list(self.latencies), 50),
+            "avg_cost_usd": sum(self.costs) / len(self.costs) if self.costs else None,
+            "parse_rate": sum(self.parsed) / len(self.parsed) if self.parsed else None,
+            "error_rate": sum(self.errors) / calls if calls else None,
+        }
+
+
+class ModelRouter:
+    def __init__(self, routes=None):
+        routes = load_routes() if routes is None else routes
+        self.settings = {**_DEFAULT_SETTINGS, **(routes.get("settings") or {})}
+        self.prices = {**MODEL_PRICES, **{m: tuple(p) for m, p in (routes.get("prices") or {}).items()}}
+        self.tasks = routes.get("tasks") or {}
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    # ---------- Choosing ----------
+    def candidates(self, task):
+        return list((self.tasks.get(task) or {}).get("candidates") or [DEFAULT_MODEL])
+
+    def pinned(self, task):
+        return os.getenv(f"LLM_MODEL_{(task or '').upper()}") or (self.tasks.get(task) or {}).get("pin")
+
+    def choose(self, task):
+        """Model for one call of `task`."""
+        if not task:
+            return DEFAULT_MODEL
+        pin = self.pinned(task)
+        if pin:
+            return pin
+        candidates = self.candidates(task)
+        if len(candidates) == 1:
+            return candidates[0]
+
+        summaries = {m: self._summary(task, m) for m in candidates}
+        untrusted = [m for m in candidates if summaries[m]["calls"] < self.settings["min_samples"]]
+        if untrusted and random.random() < self.settings["explore_rate"]:
+            return random.choice(untrusted)
+        trusted = {m: s for m, s in summaries.items() if m not in untrusted}
+        if not trusted:
+            return candidates[0]
+        return self._best(trusted) or candidates[0]
+
+    def _best(self, summaries):
+        floor = self.settings["parse_floor"]
+        reliable = {
+            m: s for m, s in summaries.items()
+            if (s["parse_rate"] is None or s["parse_rate"] >= floor) and (s["error_rate"] or 0) < 0.5
+        } or summaries
+        latencies = [s["p50_latency_s"] for s in reliable.values() if s["p50_latency_s"]]
+        costs = [s["avg_cost_usd"] for s in reliable.values() if s["avg_cost_usd"]]
+        if not latencies or not costs:
+            return None
+
+        def score(s):
+            # Each term is relative to the best candidate, so the weights trade them off directly
+            latency = (s["p50_latency_s"] or max(latencies)) / min(latencies)
+            cost = (s["avg_cost_usd"] or max(costs)) / min(costs)
+            return self.settings["latency_weight"] * latency + self.settings["cost_weight"] * cost
+
+        return min(reliable, key=lambda m: score(reliable[m]))
+
+    # ---------- Recording ----------
+    def _candidate(self, task, model):
+        with self.lock:
+            return self.stats.setdefault((task, model), _CandidateStats(self.settings["window"]))
+
+    def _summary(self, task, model):
+        stats = self._candidate(task, model)
+        with self.lock:
+            return stats.summary()
+
+    def cost(self, model, prompt_tokens, completion_tokens):
+        price_in, price_out = self.prices.get(model, self.prices.get(DEFAULT_MODEL, (0.0, 0.0)))
+        return ((prompt_tokens or 0) * price_in + (completion_tokens or 0) * price_out) / 1_000_000
+
+    def record(self, task, model, latency_s=None, prompt_tokens=None, completion_tokens=None, error=False):
+        if not task:
+            return
+        stats = self._candidate(task, model)
+        with self.lock:
+            stats.errors.append(bool(error))
+            if not error:
+                stats.latencies.append(latency_s)
+                stats.costs.append(self.cost(model, prompt_tokens, completion_tokens))
+
+    def record_parse(self, route, ok):
+        """route is the (task, model) attached to a response by llm_helpers."""
+        if not route or not route[0]:
+            return
+        stats = self._candidate(*route)
+        with self.lock:
+            stats.parsed.append(bool(ok))
+
+    def report(self):
+        """Per (task, model) rolling stats, for the Reports page."""
+        with self.lock:
+            keys = list(self.stats)
+        rows = []
+        for task, model in sorted(keys):
+            summary = self._summary(task, model)
+            if summary["calls"]:
+                rows.append({"task": task, "model": model, **summary})
+        return rows
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
+
+
+def route_model(task):
+    return get_router().choose(task)
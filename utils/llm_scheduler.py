@@ -0,0 +1,200 @@
+# ==============================
+# 🚦 Homework Helper - LLM Work Scheduler
+# ==============================
+# Every live model request takes a slot from one shared scheduler before it is sent.
+# Requests belong to a priority class - interactive (a child is waiting), prefetch (speculative
+# passage analysis) or batch (question bank refills) - and each class has its own concurrency cap.
+# Whenever a slot frees up, queued interactive requests go first, so background work never
+# makes a child wait behind it; background classes are capped below the total to leave headroom.
+#
+# Background code marks its work with `with llm_priority("batch"): ...`; everything else is interactive.
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from utils.llm_telemetry import percentile
+
+PRIORITIES = ("interactive", "prefetch", "batch")  # highest first
+SCHED_MAX_CONCURRENCY = int(os.getenv("LLM_SCHED_MAX_CONCURRENCY", "12"))  # requests in flight, all classes together
+SCHED_WINDOW = int(os.getenv("LLM_SCHED_WINDOW", "500"))  # recent queue waits kept per class
+
+
+def _parse_limits(spec):
+    """"prefetch=2,batch=2" -> {"prefetch": 2, "batch": 2}"""
+    limits = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            limits[name.strip()] = int(value)
+    return limits
+
+
+# Per-class caps; interactive may use every slot
+SCHED_LIMITS = {"prefetch": 2, "batch": 2, **_parse_limits(os.getenv("LLM_SCHED_LIMITS", ""))}
+
+_priority = contextvars.ContextVar("llm_priority", default="interactive")
+
+
+def current_priority():
+    return _priority.get()
+
+
+@contextmanager
+def llm_priority(priority):
+    """Run the LLM calls made inside this block (and in asyncio tasks it starts) at `priority`."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown LLM priority {priority!r}; expected one of {PRIORITIES}")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class _Waiter:
+    __slots__ = ("priority", "notify", "queued_at", "granted")
+
+    def __init__(self, priority, notify):
+        self.priority = priority
+        self.notify = notify
+        self.queued_at = time.monotonic()
+        self.granted = False
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency=SCHED_MAX_CONCURRENCY, limits=None, window=SCHED_WINDOW):
+        limits = SCHED_LIMITS if limits is None else limits
+        self.max_concurrency = max(1, max_concurrency)
+        self.limits = {p: max(1, min(limits.get(p, self.max_concurrency), self.max_concurrency)) for p in PRIORITIES}
+        self.running = dict.fromkeys(PRIORITIES, 0)
+        self.queues = {p: deque() for p in PRIORITIES}
+        self.waits = {p: deque(maxlen=window) for p in PRIORITIES}
+        self.served = dict.fromkeys(PRIORITIES, 0)
+        self.lock = threading.Lock()
+
+    # ---------- Slots (lock held) ----------
+    def _can_run(self, priority):
+        return sum(self.running.values()) < self.max_concurrency and self.running[priority] < self.limits[priority]
+
+    def _grant(self, waiter):
+        self.running[waiter.priority] += 1
+        self.served[waiter.priority] += 1
+        self.waits[waiter.priority].append(time.monotonic() - waiter.queued_at)
+        waiter.granted = True
+        waiter.notify()
+
+    def _dispatch(self):
+        """Hand free slots to queued requests, highest class first, FIFO within a class."""
+        for priority in PRIORITIES:
+            queue = self.queues[priority]
+            while queue and self._can_run(priority):
+                self._grant(queue.popleft())
+
+    def _enqueue(self, priority, notify):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown LLM priority {priority!r}; expected one of {PRIORITIES}")
+        waiter = _Waiter(priority, notify)
+        with self.lock:
+            self.queues[priority].append(waiter)
+            self._dispatch()
+        return waiter
+
+    def _release(self, priority):
+        with self.lock:
+            self.running[priority] -= 1
+            self._dispatch()
+
+    def _abandon(self, waiter):
+        """The caller stopped waiting (timeout/cancel): leave the queue, or give back a slot granted meanwhile."""
+        with self.lock:
+            if not waiter.granted:
+                self.queues[waiter.priority].remove(waiter)
+                return
+        self._release(waiter.priority)
+
+    # ---------- Public API ----------
+    @contextmanager
+    def slot(self, priority=None):
+        """Block until a slot for `priority` (default: the caller's llm_priority) is free; hold it for the block."""
+        granted = threading.Event()
+        waiter = self._enqueue(priority or current_priority(), granted.set)
+        try:
+            granted.wait()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        try:
+            yield
+        finally:
+            self._release(waiter.priority)
+
+    @asynccontextmanager
+    async def aslot(self, priority=None):
+        """Async twin of slot(); waiting does not block the event loop."""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def _notify():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        waiter = self._enqueue(priority or current_priority(), _notify)
+        try:
+            await granted
+        except BaseException:
+            # e.g. the call_llm_many per-task timeout fired while still queued
+            self._abandon(waiter)
+            raise
+        try:
+            yield
+        finally:
+            self._release(waiter.priority)
+
+    def try_acquire(self, priority=None):
+        """
+        Take a slot only if one is free right now; never waits. Queued requests already had every
+        free slot they could use (_dispatch runs on each change), so this can't jump ahead of them.
+        Returns the priority to pass to release(), or None. Used for optional extra requests (hedges).
+        """
+        priority = priority or current_priority()
+        with self.lock:
+            if not self._can_run(priority):
+                return None
+            self.running[priority] += 1
+            self.served[priority] += 1
+            return priority
+
+    def release(self, priority):
+        self._release(priority)
+
+    def stats(self):
+        """Per class: requests running and queued right now, requests served, and recent queue wait percentiles."""
+        with self.lock:
+            snapshot = {p: (self.running[p], len(self.queues[p]), self.served[p], list(self.waits[p])) for p in PRIORITIES}
+        rows = []
+        for priority, (running, queued, served, waits) in snapshot.items():
+            p50, p95 = percentile(waits, 50), percentile(waits, 95)
+            rows.append({
+                "priority": priority,
+                "limit": self.limits[priority],
+                "running": running,
+                "queued": queued,
+                "served": served,
+                "p50_wait_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_wait_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            })
+        return rows
+
+
+_scheduler = LLMScheduler()
+
+
+def get_scheduler():
+    return _scheduler
+
+
+def scheduler_stats():
+    return _scheduler.stats()
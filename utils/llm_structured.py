@@ -0,0 +1,340 @@
+# ==============================
+# 🧩 Homework Helper - Structured LLM Output
+# ==============================
+# One place for everything the app needs to get JSON out of a model:
+#   - JSON schemas for each structured request, sent as `response_format` where the backend supports it
+#   - JSONStreamExtractor / extract_json: a single-pass, brace-balanced scanner that pulls the first
+#     complete JSON value out of chatty or fenced output (and works chunk by chunk on streams)
+#   - JSONArrayItemStream: the strings of one array in a streamed reply, each as soon as it is complete
+#   - GrammarQuestion / TopicQuestion / PassageAnalysis: typed, validated result objects
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+
+# ---------- Schemas ----------
+def _object_schema(properties):
+    # Strict structured outputs need every property required and no extras
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+_STRING_LIST = {"type": "array", "items": {"type": "string"}}
+
+SENTENCES_SCHEMA = _object_schema({"sentences": _STRING_LIST})
+
+GRAMMAR_QUESTION_SCHEMA = _object_schema({
+    "prompt": {"type": "string"},
+    "options": _STRING_LIST,
+    "answer": {"type": "string"},
+})
+
+GRAMMAR_QUESTION_BATCH_SCHEMA = _object_schema({
+    "questions": {
+        "type": "array",
+        "items": _object_schema({
+            "id": {"type": "integer"},
+            "prompt": {"type": "string"},
+            "options": _STRING_LIST,
+            "answer": {"type": "string"},
+        }),
+    },
+})
+
+_WORD_EXPLANATIONS = {
+    "type": "array",
+    "items": _object_schema({"word": {"type": "string"}, "explanation": {"type": "string"}}),
+}
+
+PASSAGE_ANALYSIS_SCHEMA = _object_schema({
+    "simplified_paragraphs": _STRING_LIST,
+    "questions": _STRING_LIST,
+    "vocabulary": _WORD_EXPLANATIONS,
+})
+
+WORD_EXPLANATIONS_SCHEMA = _object_schema({"explanations": _WORD_EXPLANATIONS})
+
+TOPIC_QUESTION_SCHEMA = _object_schema({
+    "topic": {"type": "string"},
+    "question": {"type": "string"},
+    "options": _STRING_LIST,
+    "answer": {"type": "string"},
+})
+
+TOPIC_QUESTION_SET_SCHEMA = _object_schema({
+    "questions": {"type": "array", "items": TOPIC_QUESTION_SCHEMA},
+})
+
+
+def json_schema_format(name, schema):
+    """`response_format` payload for chat completions with a strict JSON schema."""
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+# ---------- Tolerant Extraction ----------
+_TOKEN_RE = re.compile(r'[{}\[\]"\\]')
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_ARRAY_STRING_RE = re.compile(r'\s*,?\s*("(?:[^"\\]|\\.)*")')
+_ARRAY_END_RE = re.compile(r"\s*,?\s*\]")
+
+
+def _loads(candidate):
+    try:
+        return json.loads(candidate)
+    except json.JSONDecodeError:
+        # The one repair worth making: models love trailing commas
+        return json.loads(_TRAILING_COMMA_RE.sub(r"\1", candidate))
+
+
+class JSONStreamExtractor:
+    """
+    Feed text (whole or in chunks); get back each complete top-level JSON value as soon as its
+    closing bracket arrives. Prose, markdown fences and placeholders around the JSON are skipped.
+    Scans every character once, jumping straight between brackets, quotes and escapes.
+    """
+
+    def __init__(self, expect="{["):
+        self._open_re = re.compile("[" + re.escape(expect) + "]")
+        self._parts = []
+        self._start = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk):
+        values = []
+        i, n = 0, len(chunk)
+        if self._escape and n:
+            # A backslash ended the previous chunk: this character is escaped
+            self._escape = False
+            i = 1
+        while i < n:
+            if self._depth == 0:
+                m = self._open_re.search(chunk, i)
+                if not m:
+                    break
+                self._parts, self._start = [], m.start()
+                i = m.start()
+            m = _TOKEN_RE.search(chunk, i)
+            if not m:
+                break
+            ch, i = m.group(), m.end()
+            if self._in_string:
+                if ch == "\\":
+                    if i < n:
+                        i += 1
+                    else:
+                        self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(chunk[self._start:i])
+                    try:
+                        values.append(_loads("".join(self._parts)))
+                    except json.JSONDecodeError:
+                        pass  # bracketed prose like "[Your question here]"; keep scanning
+        if self._depth > 0:
+            self._parts.append(chunk[self._start:])
+            self._start = 0
+        return values
+
+
+class JSONArrayItemStream:
+    """
+    Feed a JSON reply in chunks; get back each string of the array under `key` as soon as its
+    closing quote arrives, e.g. simplified paragraphs while the rest of the reply is still coming.
+    Only watches the first such array; parse the whole reply with extract_json once it is complete.
+    """
+
+    def __init__(self, key):
+        self._start_re = re.compile(r'"' + re.escape(key) + r'"\s*:\s*\[')
+        self._buffer = ""
+        self._inside = False
+        self._done = False
+
+    def feed(self, chunk):
+        if self._done:
+            return []
+        self._buffer += chunk
+        if not self._inside:
+            m = self._start_re.search(self._buffer)
+            if not m:
+                return []
+            self._buffer, self._inside = self._buffer[m.end():], True
+        items, pos = [], 0
+        while True:
+            m = _ARRAY_STRING_RE.match(self._buffer, pos)
+            if not m:
+                break
+            items.append(json.loads(m.group(1)))
+            pos = m.end()
+        self._buffer = self._buffer[pos:]
+        self._done = bool(_ARRAY_END_RE.match(self._buffer))
+        return items
+
+
+def extract_json(text, expect="{["):
+    """First complete JSON object/array in `text`. Raises ValueError if there is none."""
+    values = JSONStreamExtractor(expect).feed(text or "")
+    if not values:
+        raise ValueError("No JSON value found")
+    return values[0]
+
+
+def unwrap_list(value, key):
+    """Accept either the schema's {"<key>": [...]} wrapper or a bare array."""
+    if isinstance(value, dict):
+        value = value.get(key)
+    if not isinstance(value, list):
+        raise ValueError(f"Expected a list under '{key}'")
+    return value
+
+
+# ---------- Typed Questions ----------
+_ANSWER_LEAK_RE = re.compile(r"(is correct|the answer is|correct answer)", re.I)
+_META_PHRASE_RE = re.compile(r"(?i)(question on|topic:|category:)\s*[A-Za-z_ ]+[:\-]*")
+
+
+def _clean_options(options):
+    if not isinstance(options, list):
+        raise ValueError("Options malformed")
+    cleaned = [str(o).strip() for o in options if str(o).strip()]
+    if len(cleaned) < 2:
+        raise ValueError("Need at least two options")
+    return cleaned
+
+
+def _match_answer(answer, options):
+    """Return the option the answer refers to; the UI compares choices to it verbatim."""
+    answer = str(answer or "").strip()
+    if answer in options:
+        return answer
+    folded = {o.casefold(): o for o in options}
+    if answer.casefold() in folded:
+        return folded[answer.casefold()]
+    raise ValueError("Answer is not one of the options")
+
+
+@dataclass
+class GrammarQuestion:
+    prompt: str
+    options: List[str]
+    answer: str
+
+    @classmethod
+    def from_obj(cls, obj):
+        """Validate a parsed model object; raises ValueError if it can't be used."""
+        if not isinstance(obj, dict):
+            raise ValueError("Not an object")
+        if not all(k in obj for k in ("prompt", "options", "answer")):
+            raise ValueError("Missing keys")
+        prompt = _ANSWER_LEAK_RE.sub("", str(obj["prompt"])).strip()
+        if not prompt:
+            raise ValueError("Empty prompt")
+        options = _clean_options(obj["options"])
+        return cls(prompt, options, _match_answer(obj["answer"], options))
+
+    def to_dict(self, include_answer=False):
+        data = {"prompt": self.prompt, "options": list(self.options)}
+        if include_answer:
+            data["answer"] = self.answer
+        return data
+
+
+@dataclass
+class TopicQuestion:
+    topic: str
+    category: str
+    question: str
+    options: List[str]
+    answer: str
+    extra: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_obj(cls, obj, topic, category):
+        """Validate a per-topic question; topic/category default to the ones it was requested for."""
+        if not isinstance(obj, dict):
+            raise ValueError("Not an object")
+        if not all(k in obj for k in ("question", "options", "answer")):
+            raise ValueError("Missing keys")
+        question = _META_PHRASE_RE.sub("", str(obj["question"])).strip()
+        if not question:
+            raise ValueError("Empty question")
+        options = _clean_options(obj["options"])
+        extra = {k: v for k, v in obj.items() if k not in ("topic", "category", "question", "options", "answer")}
+        return cls(
+            obj.get("topic") or topic,
+            obj.get("category") or category,
+            question,
+            options,
+            _match_answer(obj["answer"], options),
+            extra,
+        )
+
+    def to_dict(self):
+        return {
+            **self.extra,
+            "topic": self.topic,
+            "category": self.category,
+            "question": self.question,
+            "options": list(self.options),
+            "answer": self.answer,
+        }
+
+
+def parse_grammar_question(obj, include_answer=False):
+    """Validated question dict for the Grammar Practice page, or ValueError."""
+    return GrammarQuestion.from_obj(obj).to_dict(include_answer)
+
+
+@dataclass
+class PassageAnalysis:
+    simplified_text: str
+    questions: List[str]
+    vocabulary: Dict[str, str]  # word -> kid-friendly explanation, in passage order
+    paragraphs: List[str] = field(default_factory=list)  # simplified text, one entry per original paragraph
+    reused_parts: int = 0  # paragraphs/chunks taken from an earlier run instead of the model
+    source_units: List[str] = field(default_factory=list)  # unit hash of each original paragraph/chunk analysed
+
+    @classmethod
+    def from_obj(cls, obj):
+        """Validate a combined simplify/questions/vocabulary reply; raises ValueError if unusable."""
+        if not isinstance(obj, dict):
+            raise ValueError("Not an object")
+        paragraphs = obj.get("simplified_paragraphs")
+        if isinstance(paragraphs, list):
+            paragraphs = [str(p).strip() for p in paragraphs if str(p).strip()]
+        else:
+            paragraphs = [str(obj.get("simplified_text") or "").strip()]
+        if not any(paragraphs):
+            raise ValueError("Empty simplified text")
+        questions = [str(q).strip() for q in obj.get("questions") or [] if str(q).strip()]
+        return cls("\n\n".join(paragraphs), questions, parse_word_explanations(obj.get("vocabulary")), paragraphs)
+
+    def explanation_for(self, word):
+        """Explanation of `word` if the analysis already covered it (case-insensitive), else None."""
+        wanted = word.strip().casefold()
+        for known, explanation in self.vocabulary.items():
+            if known.casefold() == wanted:
+                return explanation
+        return None
+
+
+def parse_word_explanations(entries):
+    """[{"word": ..., "explanation": ...}, ...] -> {word: explanation}, skipping malformed entries."""
+    explanations = {}
+    for entry in entries or []:
+        if isinstance(entry, dict) and str(entry.get("word") or "").strip() and entry.get("explanation"):
+            explanations.setdefault(str(entry["word"]).strip(), str(entry["explanation"]).strip())
+    return explanations
@@ -0,0 +1,190 @@
+# ==============================
+# 🧪 Homework Helper - Local LLM Stand-in Server
+# ==============================
+# A tiny HTTP server that speaks the OpenAI chat-completions protocol (plain and streaming),
+# answering with canned outputs after a simulated latency. Point the app at it with
+#   LLM_BACKEND=local streamlit run app.py
+# and benchmark or load-test without network access or API spend.
+#
+# Usage:
+#   python -m utils.llm_stub_server --port 8787 --latency lognormal:0.8:0.5 [--responses canned.json]
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.llm_backends import CannedResponses, LatencyModel, estimate_tokens
+
+
+class StubConfig:
+    def __init__(self, latency="0", responses=None, error_rate=0.0, error_status=429,
+                 slow_rate=0.0, slow_latency="const:5"):
+        self.latency = latency if isinstance(latency, LatencyModel) else LatencyModel(latency, slow_rate, slow_latency)
+        self.responses = responses or CannedResponses()
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+def _make_handler(config):
+    class ChatCompletionsHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass  # keep benchmark output clean
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_error(self, status):
+            body = json.dumps({"error": {"message": "simulated error", "type": "stub_error"}}).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if status == 429:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model"}]})
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": {"message": "invalid JSON body"}})
+                return
+
+            with config.lock:
+                config.requests += 1
+            if config.error_rate and random.random() < config.error_rate:
+                self._send_error(config.error_status)
+                return
+            messages = request.get("messages", [])
+            model = request.get("model", "gpt-4o-mini")
+            text = config.responses(messages).strip()
+            delay = config.latency.sample()
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            created = int(time.time())
+
+            if request.get("stream"):
+                self._stream(text, delay, completion_id, created, model)
+                return
+
+            time.sleep(delay)
+            prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+            completion_tokens = estimate_tokens(text)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+
+        def _stream(self, text, delay, completion_id, created, model):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            def event(delta, finish_reason=None):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            # Time to first token is a third of the sampled latency; the rest is spread over the words
+            time.sleep(delay / 3)
+            words = text.split(" ")
+            event({"role": "assistant", "content": ""})
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(delay * 2 / 3 / len(words))
+                event({"content": word if i == 0 else " " + word})
+            event({}, "stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+    return ChatCompletionsHandler
+
+
+def make_server(host="127.0.0.1", port=8787, latency="0", responses=None, error_rate=0.0, error_status=429,
+                slow_rate=0.0, slow_latency="const:5"):
+    """Build (but don't start) a stand-in server; port=0 picks a free port."""
+    config = StubConfig(latency, responses, error_rate, error_status, slow_rate, slow_latency)
+    server = ThreadingHTTPServer((host, port), _make_handler(config))
+    server.daemon_threads = True
+    server.config = config
+    return server
+
+
+def start_in_background(**kwargs):
+    """Start a server on a daemon thread and return it; its base URL is server.base_url."""
+    server = make_server(**kwargs)
+    host, port = server.server_address[:2]
+    server.base_url = f"http://{host}:{port}/v1"
+    threading.Thread(target=server.serve_forever, name="llm-stub-server", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in server for offline testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", default="lognormal:0.8:0.4",
+                        help='"0", "const:0.8", "uniform:0.3:1.5" or "lognormal:<median>:<sigma>"')
+    parser.add_argument("--responses", help="JSON file with [{\"match\": regex, \"response\": text-or-json}, ...]")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=429, help="HTTP status used for injected errors")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests answered slowly")
+    parser.add_argument("--slow-latency", default="const:5", help="latency spec for the slow responses")
+    args = parser.parse_args()
+
+    responses = CannedResponses.from_file(args.responses) if args.responses else None
+    server = make_server(args.host, args.port, args.latency, responses, args.error_rate, args.error_status,
+                         args.slow_rate, args.slow_latency)
+    print(f"🧪 LLM stand-in listening on http://{args.host}:{args.port}/v1 (latency {args.latency})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# ==============================
+# 📈 Homework Helper - LLM Telemetry
+# ==============================
+# One row per completion in the `llm_calls` table: which function asked, which model,
+# token usage, latency, whether the cache answered, and whether the output parsed.
+# modules/reports.py turns these rows into latency / token / parse-failure dashboards.
+import math
+from datetime import datetime, timedelta
+
+from utils.db import get_connection
+
+TELEMETRY_ENABLED = True
+
+
+class LLMText(str):
+    """A completion string that remembers which llm_calls row it came from (see mark_parsed)."""
+    call_id = None
+    cache_key = None  # llm_cache entry holding this reply, dropped if it fails to parse
+
+
+def tag(text, call_id):
+    """Attach the telemetry row id to a response string."""
+    if call_id is None or text is None:
+        return text
+    tagged = LLMText(text)
+    tagged.call_id = call_id
+    return tagged
+
+
+def record_call(feature, model, latency_s, prompt_tokens=None, completion_tokens=None,
+                cache_hit=False, error=None, ttft_s=None):
+    """Insert one telemetry row and return its id (None if telemetry is off or the write fails)."""
+    if not TELEMETRY_ENABLED:
+        return None
+    try:
+        conn = get_connection()
+        try:
+            cur = conn.execute("""
+                INSERT INTO llm_calls
+                (created_at, feature, model, prompt_tokens, completion_tokens, latency_ms, ttft_ms, cache_hit, error)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                datetime.now(),
+                feature,
+                model,
+                prompt_tokens,
+                completion_tokens,
+                round(latency_s * 1000, 1),
+                round(ttft_s * 1000, 1) if ttft_s is not None else None,
+                int(cache_hit),
+                str(error)[:500] if error else None,
+            ))
+            conn.commit()
+            return cur.lastrowid
+        finally:
+            conn.close()
+    except Exception as e:
+        # Telemetry must never break a lesson
+        print(f"LLM telemetry write failed: {e}")
+        return None
+
+
+def mark_parsed(text_or_id, ok):
+    """Record whether the output of a call parsed/validated. Accepts an LLMText or a row id."""
+    call_id = getattr(text_or_id, "call_id", text_or_id)
+    if not TELEMETRY_ENABLED or not isinstance(call_id, int):
+        return
+    try:
+        conn = get_connection()
+        try:
+            conn.execute("UPDATE llm_calls SET parse_ok = ? WHERE id = ?", (int(bool(ok)), call_id))
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"LLM telemetry update failed: {e}")
+
+
+# ---------- Reporting Queries ----------
+def percentile(values, p):
+    """Nearest-rank percentile of a list of numbers (p in 0..100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def fetch_calls(days=7):
+    """Raw telemetry rows from the last `days` days as dicts, oldest first."""
+    conn = get_connection()
+    try:
+        since = datetime.now() - timedelta(days=days)
+        cur = conn.execute("""
+            SELECT created_at, feature, model, prompt_tokens, completion_tokens,
+                   latency_ms, ttft_ms, cache_hit, parse_ok, error
+            FROM llm_calls
+            WHERE created_at >= ?
+            ORDER BY created_at
+        """, (since,))
+        columns = [d[0] for d in cur.description]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+def recent_latencies(feature, limit=200):
+    """Latency in seconds of the feature's last `limit` live, successful calls, oldest first."""
+    conn = get_connection()
+    try:
+        rows = conn.execute("""
+            SELECT latency_ms FROM llm_calls
+            WHERE feature = ? AND cache_hit = 0 AND error IS NULL AND latency_ms IS NOT NULL
+            ORDER BY id DESC LIMIT ?
+        """, (feature, limit)).fetchall()
+    finally:
+        conn.close()
+    return [row[0] / 1000 for row in reversed(rows)]
+
+
+def latency_summary(rows):
+    """Per-feature call counts, p50/p95/p99 latency (live calls only), tokens and failure rates."""
+    by_feature = {}
+    for row in rows:
+        by_feature.setdefault(row["feature"] or "unknown", []).append(row)
+
+    summary = []
+    for feature, items in sorted(by_feature.items()):
+        live = [r["latency_ms"] for r in items if not r["cache_hit"] and not r["error"] and r["latency_ms"] is not None]
+        parsed = [r["parse_ok"] for r in items if r["parse_ok"] is not None]
+        prompt_tokens = sum(r["prompt_tokens"] or 0 for r in items)
+        completion_tokens = sum(r["completion_tokens"] or 0 for r in items)
+        summary.append({
+            "feature": feature,
+            "calls": len(items),
+            "cache_hit_rate": round(sum(1 for r in items if r["cache_hit"]) / len(items), 3),
+            "error_rate": round(sum(1 for r in items if r["error"]) / len(items), 3),
+            "p50_ms": percentile(live, 50),
+            "p95_ms": percentile(live, 95),
+            "p99_ms": percentile(live, 99),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "parse_failure_rate": round(parsed.count(0) / len(parsed), 3) if parsed else None,
+        })
+    return summary
+
+
+def daily_breakdown(rows):
+    """Per-day p50/p95 latency, token totals and parse-failure rate, for the trend charts."""
+    by_day = {}
+    for row in rows:
+        day = str(row["created_at"])[:10]
+        by_day.setdefault(day, []).append(row)
+
+    days = []
+    for day, items in sorted(by_day.items()):
+        live = [r["latency_ms"] for r in items if not r["cache_hit"] and not r["error"] and r["latency_ms"] is not None]
+        parsed = [r["parse_ok"] for r in items if r["parse_ok"] is not None]
+        days.append({
+            "day": day,
+            "calls": len(items),
+            "p50_ms": percentile(live, 50),
+            "p95_ms": percentile(live, 95),
+            "tokens": sum((r["prompt_tokens"] or 0) + (r["completion_tokens"] or 0) for r in items),
+            "parse_failure_rate": round(parsed.count(0) / len(parsed), 3) if parsed else None,
+        })
+    return days
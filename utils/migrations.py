@@ -0,0 +1,285 @@
+# ==============================
+# 🧱 Homework Helper - Schema Migrations
+# ==============================
+# Owns every table in data/homework_helper.db. Each migration runs once, in order, inside
+# one transaction, and is recorded in `schema_version`. utils/db_connection.py runs pending
+# migrations the first time the process opens the database, so modules don't create tables.
+#
+# To change the schema, append a migration; never edit one that has shipped.
+#
+#   python -m utils.migrations            # apply pending migrations and print the version
+#   python -m utils.migrations --explain  # EXPLAIN QUERY PLAN for the hot-path queries
+from datetime import datetime
+
+MIGRATIONS = [
+    (1, "baseline: every table the app uses", [
+        # ORM tables (models in utils/db.py)
+        """CREATE TABLE IF NOT EXISTS sessions
+        (
+            id         INTEGER NOT NULL PRIMARY KEY,
+            created_at DATETIME,
+            topic      VARCHAR
+        )""",
+        """CREATE TABLE IF NOT EXISTS passages
+        (
+            id              INTEGER NOT NULL PRIMARY KEY,
+            session_id      INTEGER REFERENCES sessions (id),
+            original_text   TEXT,
+            simplified_text TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS questions
+        (
+            id            INTEGER NOT NULL PRIMARY KEY,
+            passage_id    INTEGER REFERENCES passages (id),
+            question_text TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS words
+        (
+            id          INTEGER NOT NULL PRIMARY KEY,
+            passage_id  INTEGER REFERENCES passages (id),
+            word        VARCHAR,
+            explanation TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS concepts
+        (
+            id         INTEGER NOT NULL PRIMARY KEY,
+            date_start DATETIME NOT NULL,
+            date_end   DATETIME,
+            subject    VARCHAR NOT NULL,
+            topic      TEXT NOT NULL,
+            type       VARCHAR,
+            notes      TEXT,
+            created_at DATETIME
+        )""",
+        """CREATE TABLE IF NOT EXISTS topics
+        (
+            id             INTEGER NOT NULL PRIMARY KEY,
+            name           VARCHAR NOT NULL UNIQUE,
+            subject        VARCHAR,
+            grade_level    INTEGER,
+            active         BOOLEAN,
+            last_seen_date DATETIME,
+            updated_at     DATETIME
+        )""",
+        # Concept map and prompt templates (loaded from data/*.yaml)
+        """CREATE TABLE IF NOT EXISTS concept_map
+        (
+            id             INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject        TEXT,
+            category       TEXT,
+            topic          TEXT,
+            question_focus TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS prompts
+        (
+            id              INTEGER PRIMARY KEY AUTOINCREMENT,
+            category        TEXT,
+            topic           TEXT,
+            prompt_template TEXT,
+            example         TEXT
+        )""",
+        # Practice history (utils/db.log_attempt)
+        """CREATE TABLE IF NOT EXISTS attempts
+        (
+            id               INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject          TEXT NOT NULL,
+            topic            TEXT,
+            question_type    TEXT,
+            question_text    TEXT NOT NULL,
+            user_answer      TEXT,
+            correct_answer   TEXT,
+            is_correct       BOOLEAN,
+            hint_used        BOOLEAN   DEFAULT 0,
+            difficulty_level TEXT      DEFAULT 'normal',
+            attempt_date     TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        # Grammar question pool (utils/question_bank.py)
+        """CREATE TABLE IF NOT EXISTS question_bank
+        (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic      TEXT NOT NULL,
+            category   TEXT,
+            question   TEXT NOT NULL,
+            options    TEXT NOT NULL,
+            answer     TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_question_bank_topic ON question_bank (topic)",
+        # LLM response cache (utils/llm_cache.py)
+        """CREATE TABLE IF NOT EXISTS llm_cache
+        (
+            key          TEXT PRIMARY KEY,
+            model        TEXT,
+            response     TEXT NOT NULL,
+            created_at   REAL NOT NULL,
+            last_used_at REAL NOT NULL,
+            hit_count    INTEGER DEFAULT 0
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_llm_cache_last_used ON llm_cache (last_used_at)",
+        # LLM telemetry (utils/llm_telemetry.py)
+        """CREATE TABLE IF NOT EXISTS llm_calls
+        (
+            id                INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at        TIMESTAMP NOT NULL,
+            feature           TEXT,
+            model             TEXT,
+            prompt_tokens     INTEGER,
+            completion_tokens INTEGER,
+            latency_ms        REAL,
+            ttft_ms           REAL,
+            cache_hit         BOOLEAN DEFAULT 0,
+            parse_ok          BOOLEAN,
+            error             TEXT
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_llm_calls_created_at ON llm_calls (created_at)",
+        # Word explanations (utils/glossary.py)
+        """CREATE TABLE IF NOT EXISTS glossary
+        (
+            word        TEXT NOT NULL,
+            window_hash TEXT NOT NULL,
+            explanation TEXT NOT NULL,
+            created_at  REAL NOT NULL,
+            hit_count   INTEGER DEFAULT 0,
+            PRIMARY KEY (word, window_hash)
+        )""",
+        # Per-paragraph simplifications (utils/paragraph_cache.py)
+        """CREATE TABLE IF NOT EXISTS simplified_paragraphs
+        (
+            hash       TEXT PRIMARY KEY,
+            simplified TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )""",
+        # Daily token budget (utils/llm_budget.py)
+        """CREATE TABLE IF NOT EXISTS llm_token_usage
+        (
+            day     TEXT NOT NULL,
+            feature TEXT NOT NULL,
+            tokens  INTEGER NOT NULL DEFAULT 0,
+            calls   INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, feature)
+        )""",
+        """CREATE TABLE IF NOT EXISTS llm_token_quotas
+        (
+            feature      TEXT PRIMARY KEY,
+            daily_tokens INTEGER NOT NULL
+        )""",
+    ]),
+    (2, "hot-path indexes for topic/category lookups and practice history", [
+        # Case-insensitive topic lookups by subject (concept_map_db now resolves topics from an
+        # in-memory index built by one full scan, so this only serves ad-hoc queries)
+        "CREATE INDEX IF NOT EXISTS ix_concept_map_subject_topic_lower ON concept_map (subject, LOWER(topic))",
+        # Topic questions by category: LOWER(cm.category) = LOWER(?)
+        "CREATE INDEX IF NOT EXISTS ix_concept_map_category_lower ON concept_map (LOWER(category))",
+        # concept_map JOIN topics ON cm.topic = t.name WHERE t.active = 1
+        "CREATE INDEX IF NOT EXISTS ix_concept_map_topic ON concept_map (topic)",
+        "CREATE INDEX IF NOT EXISTS ix_topics_active_name ON topics (active, name)",
+        # Prompt templates: LOWER(category) = LOWER(?) [AND LOWER(topic) = LOWER(?)]
+        "CREATE INDEX IF NOT EXISTS ix_prompts_category_topic_lower ON prompts (LOWER(category), LOWER(topic))",
+        # Practice history summaries and recent attempts
+        "CREATE INDEX IF NOT EXISTS ix_attempts_subject_topic ON attempts (subject, topic)",
+        "CREATE INDEX IF NOT EXISTS ix_attempts_attempt_date ON attempts (attempt_date)",
+        "ANALYZE",
+    ]),
+]
+
+
+def current_version(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version
+        (
+            version     INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at  TIMESTAMP NOT NULL
+        )
+    """)
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply every pending migration, each in its own transaction. Returns the resulting version."""
+    version = current_version(conn)
+    for number, description, statements in MIGRATIONS:
+        if number <= version:
+            continue
+        # IMMEDIATE takes the write lock up front, so two processes can't apply the same step
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM schema_version WHERE version = ?", (number,)).fetchone():
+                conn.rollback()
+                continue
+            for sql in statements:
+                conn.execute(sql)
+            conn.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (number, description, datetime.now()),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version = number
+    return version
+
+
+# ---------- Query Plan Checks ----------
+# Hot-path queries with example parameters; none of them should read a whole table
+HOT_QUERIES = [
+    ("prompt template by category and topic",
+     "SELECT prompt_template, example FROM prompts WHERE LOWER(category) = LOWER(?) AND LOWER(topic) = LOWER(?) LIMIT 1",
+     ("punctuation", "commas")),
+    ("prompt template by category",
+     "SELECT prompt_template FROM prompts WHERE LOWER(category) = LOWER(?) ORDER BY id DESC LIMIT 1",
+     ("punctuation",)),
+    ("active topics in a category",
+     "SELECT cm.topic FROM concept_map cm JOIN topics t ON cm.topic = t.name "
+     "WHERE LOWER(cm.category) = LOWER(?) AND t.active = 1",
+     ("punctuation",)),
+    ("all active topics",
+     "SELECT cm.topic FROM concept_map cm JOIN topics t ON cm.topic = t.name WHERE t.active = 1",
+     ()),
+    ("attempts summary",
+     "SELECT subject, topic, COUNT(*) FROM attempts GROUP BY subject, topic",
+     ()),
+    ("recent attempts",
+     "SELECT subject, topic FROM attempts WHERE attempt_date >= datetime('now', ?) ORDER BY attempt_date DESC",
+     ("-7 days",)),
+]
+
+
+def explain_hot_queries(conn):
+    """EXPLAIN QUERY PLAN for each hot query: [{"query", "plan", "full_scan"}]."""
+    report = []
+    for name, sql, params in HOT_QUERIES:
+        plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+        report.append({
+            "query": name,
+            "plan": plan,
+            # "SCAN x USING ... INDEX" walks an index in order; a bare "SCAN x" reads the whole table
+            "full_scan": any(step.startswith("SCAN") and "USING" not in step for step in plan),
+        })
+    return report
+
+
+def main():
+    import argparse
+    from utils.db_connection import DB_PATH, get_connection
+
+    parser = argparse.ArgumentParser(description="Apply schema migrations to the app database.")
+    parser.add_argument("--explain", action="store_true", help="show query plans for the hot-path queries")
+    args = parser.parse_args()
+
+    conn = get_connection()  # the first connection applies pending migrations
+    try:
+        print(f"{DB_PATH}: schema version {current_version(conn)} of {MIGRATIONS[-1][0]}")
+        if args.explain:
+            for row in explain_hot_queries(conn):
+                status = "SCAN" if row["full_scan"] else "ok  "
+                print(f"  [{status}] {row['query']}")
+                for step in row["plan"]:
+                    print(f"           {step}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
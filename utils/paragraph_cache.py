@@ -0,0 +1,52 @@
+# ==============================
+# 🧱 Homework Helper - Simplified Paragraph Store
+# ==============================
+# Remembers the simplified version of every paragraph (or chunk) we have sent to the model,
+# keyed by a hash of its text. When a parent fixes a typo and simplifies again, only the
+# paragraphs whose hash changed need a new model call; the rest are stitched back from here.
+import hashlib
+import time
+
+from utils.db import get_connection
+
+
+def unit_hash(text):
+    """Hash of a paragraph, insensitive to whitespace-only changes."""
+    normalized = " ".join(text.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def lookup_many(units):
+    """{hash: simplified} for every unit that has been simplified before."""
+    hashes = list({unit_hash(u) for u in units})
+    if not hashes:
+        return {}
+    conn = get_connection()
+    try:
+        placeholders = ",".join("?" * len(hashes))
+        rows = conn.execute(
+            f"SELECT hash, simplified FROM simplified_paragraphs WHERE hash IN ({placeholders})", hashes
+        ).fetchall()
+        return dict(rows)
+    finally:
+        conn.close()
+
+
+def store_many(pairs):
+    """Save (original unit, simplified unit) pairs; error placeholders are skipped."""
+    now = time.time()
+    rows = [
+        (unit_hash(original), simplified.strip(), now)
+        for original, simplified in pairs
+        if simplified and simplified.strip() and not simplified.startswith("(LLM error")
+    ]
+    if not rows:
+        return
+    conn = get_connection()
+    try:
+        conn.executemany(
+            "INSERT OR REPLACE INTO simplified_paragraphs (hash, simplified, created_at) VALUES (?, ?, ?)", rows
+        )
+        conn.commit()
+    finally:
+        conn.close()
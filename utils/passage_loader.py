@@ -2,20 +2,15 @@
 
 import os
 import random
+import re
 import requests
-import sqlite3
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from bs4 import BeautifulSoup
+from utils.db import SessionLocal
 
 # ---------- CONFIG ----------
-DB_PATH = "data/homework_helper.db"
 LOCAL_PASSAGE_DIR = "data/passages"
 os.makedirs(LOCAL_PASSAGE_DIR, exist_ok=True)
 
-engine = create_engine(f"sqlite:///{DB_PATH}", echo=False)
-SessionLocal = sessionmaker(bind=engine)
-
 # ---------- UTILITIES ----------
 def load_local_passages():
     """Load all .txt files in data/passages as passages."""
@@ -61,20 +56,46 @@ def clean_text(text):
     text = text.replace("\r", "").strip()
     return text
 
-def split_into_passages(text, min_len=300, max_len=800):
-    """Split long text into smaller passages based on paragraphs."""
+def group_paragraphs(text, max_len=800, split_long=False):
+    """
+    Group consecutive paragraphs into chunks of up to max_len characters, keeping their order.
+    With split_long=True, paragraphs longer than max_len are first broken at sentence ends
+    (PDF text often has no blank lines between paragraphs).
+    """
     paragraphs = [p.strip() for p in text.split("\n\n") if len(p.strip()) > 0]
-    passages = []
+    if split_long:
+        paragraphs = [piece for p in paragraphs for piece in _split_long_paragraph(p, max_len)]
+    chunks = []
     current = ""
     for p in paragraphs:
         if len(current) + len(p) < max_len:
             current += "\n\n" + p
         else:
-            if len(current) > min_len:
-                passages.append(current.strip())
+            if current.strip():
+                chunks.append(current.strip())
             current = p
-    if len(current) > min_len:
-        passages.append(current.strip())
+    if current.strip():
+        chunks.append(current.strip())
+    return chunks
+
+def _split_long_paragraph(paragraph, max_len):
+    if len(paragraph) <= max_len:
+        return [paragraph]
+    pieces = []
+    current = ""
+    for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+        if current and len(current) + len(sentence) + 1 > max_len:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        pieces.append(current)
+    return pieces
+
+def split_into_passages(text, min_len=300, max_len=800):
+    """Split long text into smaller passages based on paragraphs."""
+    passages = [chunk for chunk in group_paragraphs(text, max_len) if len(chunk) > min_len]
     random.shuffle(passages)
     return passages
 
@@ -0,0 +1,190 @@
+# ==============================
+# 🏦 Homework Helper - Grammar Question Bank
+# ==============================
+# A pool of pre-generated, validated multiple-choice grammar questions per active topic.
+# Grammar Practice serves from the pool instantly; a background worker keeps every
+# active topic topped up to QUESTION_BANK_TARGET whenever it drops below QUESTION_BANK_LOW_WATER.
+import json
+import os
+import random
+import threading
+from datetime import datetime
+
+from utils.db import get_connection
+
+QUESTION_BANK_LOW_WATER = int(os.getenv("QUESTION_BANK_LOW_WATER", "3"))  # refill a topic below this many questions
+QUESTION_BANK_TARGET = int(os.getenv("QUESTION_BANK_TARGET", "6"))  # ...back up to this many
+QUESTION_BANK_MAX_PER_REFILL = int(os.getenv("QUESTION_BANK_MAX_PER_REFILL", "20"))  # cap on questions per refill round
+QUESTION_BANK_REFILL_INTERVAL = float(os.getenv("QUESTION_BANK_REFILL_INTERVAL", "300"))  # seconds between idle checks
+
+DEBUG = False  # Set to False to disable debug logs
+
+_worker = None
+_worker_lock = threading.Lock()
+_wake = threading.Event()
+_stop = threading.Event()
+
+
+def _is_valid(item):
+    """Only real multiple-choice questions go into the bank (no placeholder fillers)."""
+    if not isinstance(item, dict) or not item.get("topic") or not item.get("question"):
+        return False
+    options = item.get("options")
+    answer = item.get("answer")
+    return isinstance(options, list) and len(options) >= 2 and bool(answer) and answer in options
+
+
+def add_questions(items):
+    """Store validated questions; returns how many were accepted."""
+    rows = [
+        (
+            item["topic"],
+            item.get("category"),
+            item["question"],
+            json.dumps(item["options"]),
+            item["answer"],
+            datetime.now(),
+        )
+        for item in items
+        if _is_valid(item)
+    ]
+    if not rows:
+        return 0
+    conn = get_connection()
+    try:
+        conn.executemany("""
+            INSERT INTO question_bank (topic, category, question, options, answer, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.commit()
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def take_questions(n, category=None):
+    """
+    Remove and return up to `n` questions for active topics (optionally one category),
+    spread across as many topics as possible. Each question is served once.
+    """
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        sql = """
+            SELECT qb.id, qb.topic, qb.category, qb.question, qb.options, qb.answer
+            FROM question_bank qb
+                     JOIN topics t ON qb.topic = t.name
+            WHERE t.active = 1
+        """
+        params = []
+        if category:
+            sql += " AND LOWER(qb.category) = LOWER(?)"
+            params.append(category)
+        rows = conn.execute(sql + " ORDER BY RANDOM()", params).fetchall()
+
+        # Round-robin across topics so one well-stocked topic doesn't fill the whole set
+        by_topic = {}
+        for row in rows:
+            by_topic.setdefault(row[1], []).append(row)
+        topic_names = list(by_topic)
+        random.shuffle(topic_names)
+        picked = []
+        while len(picked) < n and any(by_topic.values()):
+            for name in topic_names:
+                if by_topic[name] and len(picked) < n:
+                    picked.append(by_topic[name].pop())
+
+        if picked:
+            conn.executemany("DELETE FROM question_bank WHERE id = ?", [(row[0],) for row in picked])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return [
+        {
+            "topic": topic,
+            "category": cat,
+            "question": question,
+            "options": json.loads(options),
+            "answer": answer,
+        }
+        for _, topic, cat, question, options, answer in picked
+    ]
+
+
+def pool_levels():
+    """Return {topic: available question count} for every active topic (0 when empty)."""
+    conn = get_connection()
+    try:
+        rows = conn.execute("""
+            SELECT t.name, COUNT(qb.id)
+            FROM topics t
+                     LEFT JOIN question_bank qb ON qb.topic = t.name
+            WHERE t.active = 1
+              AND EXISTS (SELECT 1 FROM concept_map cm WHERE cm.topic = t.name)
+            GROUP BY t.name
+        """).fetchall()
+    finally:
+        conn.close()
+    return {name: count for name, count in rows}
+
+
+def refill_once():
+    """
+    Generate questions for every active topic below the low-water mark.
+    Returns the number of questions added.
+    """
+    from utils.llm_helpers import generate_topic_question_sets
+    from utils.llm_scheduler import llm_priority
+
+    wanted, budget = {}, QUESTION_BANK_MAX_PER_REFILL
+    for topic, count in sorted(pool_levels().items(), key=lambda kv: kv[1]):
+        if count < QUESTION_BANK_LOW_WATER and budget > 0:
+            wanted[topic] = min(QUESTION_BANK_TARGET - count, budget)
+            budget -= wanted[topic]
+    if not wanted:
+        return 0
+
+    # One request per topic for all of its missing questions.
+    # Batch class: never competes with a child waiting on an answer
+    with llm_priority("batch"):
+        items = generate_topic_question_sets(wanted)
+    added = add_questions(items)
+    if DEBUG:
+        print(f"DEBUG: question bank refill asked for {sum(wanted.values())}, stored {added}")
+    return added
+
+
+def _refill_loop():
+    while not _stop.is_set():
+        try:
+            refill_once()
+        except Exception as e:
+            print(f"Question bank refill failed: {e}")
+        _wake.wait(QUESTION_BANK_REFILL_INTERVAL)
+        _wake.clear()
+
+
+def start_refill_worker():
+    """Start the background refill thread once per process. Safe to call on every rerun."""
+    global _worker
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return _worker
+        _stop.clear()
+        _worker = threading.Thread(target=_refill_loop, name="question-bank-refill", daemon=True)
+        _worker.start()
+        return _worker
+
+
+def request_refill():
+    """Wake the worker early, e.g. right after questions were taken from the pool."""
+    _wake.set()
+
+
+def stop_refill_worker():
+    _stop.set()
+    _wake.set()
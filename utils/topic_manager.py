@@ -1,18 +1,16 @@
-import datetime, os, yaml, sys, streamlit as st, sqlite3
+import datetime, os, yaml, sys, streamlit as st
 from datetime import datetime
+from utils.db_connection import DB_PATH, get_connection
+from utils.concept_map_db import invalidate_concepts
 
 
-DB_PATH = "data/homework_helper.db"
-# DB_PATH = os.path.join(os.path.dirname(__file__), "..", "/data/homework_helper.db")
-def get_connection():
-    return sqlite3.connect(DB_PATH)
 YAML_PATH = "data/grammar_hints.yaml"
 
 def sync_topics_to_concepts():
     """
     Copy active topics from the topics table into the concepts table if not already present.
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     cur = conn.cursor()
 
     # Select all active topics
@@ -49,7 +47,7 @@ def sync_topics_to_concepts():
 def sync_yaml_to_db():
     st.write("🔍 Using database:", os.path.abspath(DB_PATH))
     """Sync topics from a YAML file into the SQLite topics table."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     cur = conn.cursor()
     _YAML_PATH = "data/grammar_combined.yaml"
 
@@ -108,6 +106,7 @@ def sync_yaml_to_db():
 
     conn.commit()
     conn.close()
+    invalidate_concepts()  # get_concept reloads the concept map on its next lookup
 
     print(f"\nSummary:")
     print(f"✅ Inserted: {inserted}")